@@ -1,6 +1,8 @@
 #####################
 # Welcome to the autocopy program for risk improvements
 # Firstly, make sure you have setup the risk improvements database. Do this by going into RI_database_setup.py (in Programs\Databases) and following the instructions.
+# To publish a new version of the RIs, run this program with --import master_list.xlsx (or .csv/.json) instead (see "Importing a new version" below).
+# To prepare the RIs for a whole folder of jobs at once (no window), run it with --batch {folder} (see "Batch mode" below).
 # The purpose of this program is to take the users input, look into the database for the given RI code, and output the risk improvement (automatically copied to your clipboard)
 # Most of the complexity comes from how the user inputs what they want and how the output is formatted. 
 # Run this program and type "help" in the terminal for a detailed summary of all the instruction codes (as this is a fully text-based program)
@@ -10,256 +12,35 @@
 # I am also in the process of developing a way to change the database from within this program, however this is also not fully implemented.
 # In the meantime, use DB Browser for SQLite (download from the internet) to edit the database.
 #####################
+# The database is opened through db_utils.py, and the window is in autoCopy3_window.py (keep both in the same folder as this program).
+#####################
 # Please note, there is quite a bit of dead weight in this code (old implementations, etc). I'll hopefully get around to tidying it up...
+# To keep it quick to open, the window is shown straight away and the database is loaded in the background (see Engine.start), and anything only
+# needed later (pyperclip, the batch mode process pool, tkinter for the window) is imported when first used. The time until it's ready for input is printed when it opens.
 #####################
 
+import time
+started = time.perf_counter()  # For the startup timer (before the other imports, so they're counted)
+
 import os
-import pyperclip
 import sys
 import sqlite3
 import re
 import json
-import tkinter as tk
-from tkinter import ttk
-from tkinter.scrolledtext import ScrolledText
+import hashlib
+import getpass
+import argparse
+import csv
+import itertools
+from datetime import date
 import threading
-import queue
 from collections import Counter
+import db_utils
 
 windowed = True
 
 program_ver = "3.01"
 
-class StdoutRedirector:
-    def __init__(self, text_widget):
-        self.text_widget = text_widget
-        self.text_widget.tag_configure("input", foreground="grey")
-        self.text_widget.tag_configure("warning", foreground="red")
-
-    def write(self, string):
-        self.text_widget.after(0, self._write, string)
-
-    def _write(self, string):
-        self.text_widget.config(state='normal')
-        if string.startswith(">>> "):
-            self.text_widget.insert(tk.END, string, "input")
-        elif "Warning:" in string:
-            self.text_widget.insert(tk.END, string, "warning")
-        else:
-            self.text_widget.insert(tk.END, string)
-        self.text_widget.see(tk.END)
-        self.text_widget.config(state='disabled')
-
-    def flush(self):
-        pass
-
-class StdinRedirector:
-    def __init__(self, gui_ref):
-        self.input_queue = queue.Queue()
-        self.gui = gui_ref
-
-    def readline(self):
-        self.gui.expecting_line_input = True
-        self.gui.set_input_mode_label(multiline=False)
-        line = self.input_queue.get()
-        self.gui.expecting_line_input = False
-        return line
-
-    def read(self, n=-1):
-        self.gui.expecting_line_input = False
-        self.gui.set_input_mode_label(multiline=True)
-        return self.input_queue.get()
-
-    def push(self, text):
-        self.input_queue.put(text + '\n')
-
-class TerminalApp(tk.Tk):
-    def __init__(self, target_function):
-        super().__init__()
-        self.title(f"AutoCopy{program_ver}")
-
-        self.expecting_line_input = False  # Flag for Enter key behaviour
-
-        container = ttk.Frame(self, padding=10)
-        container.pack(expand=True, fill='both')
-
-        self.controls_visible = True
-        self.manual_override_disabled = False
-
-        # Output label and box
-        self.output_label = ttk.Label(container, text="Output:")
-        self.output_label.pack(anchor='w')
-        self.output = ScrolledText(container, height=8, wrap='word', bg='white', fg='black', font = ("Consolas", 10))
-        self.output.pack(fill='both', expand=True, pady=(0, 10))
-        self.output.config(state='disabled')
-
-        # Input label and box
-        self.input_label = ttk.Label(container, text="Input:")
-        self.input_label.pack(anchor='w')
-        self.input_text = ScrolledText(container, height=8, wrap='word', bg='white', fg='black', font = ("Consolas", 10))
-        self.input_text.pack(fill='x')
-        self.input_text.bind("<Return>", self.handle_return)
-        self.input_text.bind("<Control-Return>", self.ctrl_enter_submit)
-
-        self.input_text.bind("<Button-3>", self.paste_from_clipboard)
-
-        ttk.Label(container, text="Codes to Copy:").pack(anchor='w', pady=(10, 0))
-
-        # Display area for list (read-only text box)
-        self.display_list_label = ttk.Label(container, text="", anchor='w', background='white')
-        self.display_list_label.pack(fill='x', pady=(0, 10))
-
-        button_row = ttk.Frame(container)
-        button_row.pack(pady=(10, 0))
-
-        ttk.Button(button_row, text="Toggle Controls", command=self.toggle_controls).pack(side='left', padx=(0, 5))
-        ttk.Button(button_row, text="Help", command=lambda: self.on_instruction_press("help")).pack(side='left')
-
-        # === Controls Section (Settings + Instructions + Submit) ===
-        self.controls_frame = ttk.Frame(container)
-        self.controls_frame.pack(fill='x', pady=10)
-
-        # Settings (checkboxes)
-        settings_frame = ttk.LabelFrame(self.controls_frame, text="Settings")
-        settings_frame.pack(side='left', expand=True, fill='both', padx=(0, 10))
-
-        setting_names = [("Header", 'h'), ("Dash", '-'), ("Additional Info", 'i'), ("Show Full RI", 'p'), ("Warnings", 'w'), ("Debug", 'o')]
-        self.settings = []
-        for i in range(6):
-            name, char = setting_names[i]
-            var = tk.BooleanVar()
-            cb = ttk.Checkbutton(settings_frame, text=name, variable=var)
-            cb.config(command=lambda c=char: self.on_setting_toggle(c))
-            cb.pack(anchor='w', padx=5, pady=2)
-            self.settings.append((var, cb))
-
-        # Instructions (buttons)
-        instructions_frame = ttk.LabelFrame(self.controls_frame, text="Instructions")
-        instructions_frame.pack(side='right', expand=True, fill='both')        
-
-        instruction_names = [("Next", 'x'), ("Auto Setup (paste all RIs)", 'z'), ("Manual Setup (enter RIs one-by-one)", 's'), ("Show copied codes", 'c'), ("Finish", 'f')]
-
-        self.instruction_buttons = []
-        for name, char in instruction_names:
-            b = ttk.Button(instructions_frame, text=name)
-            b.config(command=lambda c=char: self.on_instruction_press(c))
-            b.pack(fill='x', padx=5, pady=2)
-            self.instruction_buttons.append(b)
-
-        # Separator + Submit button frame
-        self.submit_section = ttk.Frame(container)
-        self.submit_section.pack(fill='x')
-
-        ttk.Separator(self.submit_section, orient='horizontal').pack(fill='x', pady=(10, 5))
-        ttk.Button(self.submit_section, text="Submit", command=self.on_submit).pack(fill='x')
-
-        # Redirection + target function thread
-        self.stdin = StdinRedirector(self)
-        self.stdout = StdoutRedirector(self.output)
-        sys.stdin = self.stdin
-        sys.stdout = self.stdout
-
-        
-
-        self.thread = threading.Thread(target=target_function, daemon=True)
-        self.thread.start()
-    
-    def paste_from_clipboard(self, event=None):
-        try:
-            text = self.clipboard_get()
-            self.input_text.insert(tk.INSERT, text)
-        except tk.TclError:
-            pass  # Clipboard empty or not text
-
-    def on_submit(self):
-        text = self.input_text.get("1.0", tk.END).strip()
-        if text:
-            self.input_text.delete("1.0", tk.END)
-            sys.stdout.write(f">>> {text}\n")
-            self.stdin.push(text)
-
-    def handle_return(self, event):
-        if self.expecting_line_input:
-            self.on_submit()
-            return "break"  # Prevent newline insertion
-        # Else: allow newline
-
-    def ctrl_enter_submit(self, event):
-        self.on_submit()
-        return "break"
-
-    def toggle_controls(self):
-        if self.controls_visible:
-            self.controls_frame.pack_forget()
-            self.submit_section.pack_forget()
-        else:
-            self.controls_frame.pack(fill='x', pady=10)
-            self.submit_section.pack(fill='x')
-        self.controls_visible = not self.controls_visible
-
-    def on_instruction_press(self, char):
-        sys.stdout.write(f">>> {char}\n")
-        self.stdin.push(char)
-
-    def on_setting_toggle(self, char):
-        sys.stdout.write(f">>> {char}\n")
-        self.stdin.push(char)
-    
-    def setup_disability(self):
-        def disable_widgets():
-            manual_setup_index = 2  # Index of "Manual Setup (enter RIs one-by-one)"
-            self.manual_override_disabled = True
-            for i, button in enumerate(self.instruction_buttons):
-                state = 'normal' if i == manual_setup_index else 'disabled'
-                button.config(state=state)
-            for _, cb in self.settings:
-                cb.config(state='disabled')
-
-        self.after(0, disable_widgets)
-
-    def enable_all_instruction_buttons(self):
-        def enable_widgets():
-            self.manual_override_disabled = False
-            for b in self.instruction_buttons:
-                b.config(state='enabled')
-            for _, cb in self.settings:
-                cb.config(state='enabled')
-
-        self.after(0, enable_widgets)
-
-    def set_input_mode_label(self, multiline=False):
-        if multiline:
-            self.input_label.config(text="Input (Multi-line - ctrl-Enter or press Submit button to submit):")
-            for b in self.instruction_buttons:
-                b.config(state='disabled')
-            for _, cb in self.settings:
-                cb.config(state='disabled')
-        else:
-            self.input_label.config(text="Input:")
-            if not self.manual_override_disabled:
-                for b in self.instruction_buttons:
-                    b.config(state='normal')
-                for _, cb in self.settings:
-                    cb.config(state='normal')
-
-    def set_output_mode_label(self, table_name='Unknown!'):
-        self.output_label.config(text=f"Output (from {table_name}):")
-
-    def sync_checkboxes(self, settings_dict):
-        # Keys must match the order of self.settings
-        settings_keys = ["codeHeader", "autoDash", "additional_info",
-                        "showRI", "warnings", "allWarnings"]
-        
-        for (var, _), key in zip(self.settings, settings_keys):
-            new_value = settings_dict.get(key, False)
-            if var.get() != new_value:
-                var.set(new_value)
-
-    def update_display_list(self, items):
-        display_text = ", ".join(str(item) for item in items)
-        self.display_list_label.config(text=display_text)
-
-
 def resource_path(relative_path):
     """ Get absolute path to resource, whether running as script or PyInstaller .exe """
     if hasattr(sys, '_MEIPASS'):
@@ -273,53 +54,271 @@ def resource_path(relative_path):
 db_path = resource_path(os.path.join("Databases", "risk_improvements.db"))
 print(db_path)
 
-#table_name = "RI20250424" #specify which table to use in the database
+fixed_table_name = "RI20250424" #specify which table to use in the database (only used if table_name_highest_table is False)
 table_name_highest_table = True #automatically pick the most recent table in the database
 
 conn = None
 cursor = None
+catalogue = None
 
 nonInstructionLetters = {'M', 'A', 'R', 'X'}
 
+search_hits = []  # Codes found by the last search, so they can be copied with ?1, ?2, etc
+
 warnings_allowed = False
 
-def get_input(prompt=""):
-    print(prompt, end="")  # this will go to your GUI
-    return sys.stdin.readline().strip()
+#####################
+# Local replica
+# Databases/risk_improvements.db is on the OneDrive share, so reading it directly can hang on syncing or on someone else's lock.
+# Instead, it's copied to this computer (replica_dir) and everything is read from the copy. The copy is refreshed in the background whenever the shared file changes,
+# and a newer RI table is switched to without restarting. Changes (edits, acknowledged codes) are made to the copy straight away and queued to be saved to the shared file in order.
+#####################
+
+use_local_replica = True
+replica_dir = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "AutoCopy")
+
+replica = None
+
+class LocalReplica:
+    check_interval = 2  # Seconds between checks for changes to the shared database
+    max_age = 24 * 60 * 60  # Copies left behind (e.g. after a crash) are deleted after this many seconds
+
+    def __init__(self, shared_path, local_dir):
+        self.shared_path = shared_path
+        self.local_dir = local_dir
+        self.prefix = f"risk_improvements_{os.getpid()}_"
+
+        self.lock = threading.Lock()  # For the state below
+        self.copying = threading.Lock()  # So only one copy is made at a time
+        self.wake = threading.Event()
+        self.pending = []  # Writes not yet saved to the shared database
+        self.submitted = 0  # Writes queued so far
+        self.applied = 0  # Writes saved to the shared database so far
+        self.signature = None  # The shared database's signature when it was last copied
+        self.latest = None  # (path, writes included) of the newest copy
+        self.current = None  # Path of the copy being read from
+        self.old = []  # Copies to delete once they're closed
+        self.shared = None
+        self.failing = False
+
+        os.makedirs(local_dir, exist_ok=True)
+        self.clean_up()
+        self.copy()
+
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def clean_up(self):
+        for name in os.listdir(self.local_dir):
+            path = os.path.join(self.local_dir, name)
+            try:
+                if name.startswith("risk_improvements_") and time.time() - os.path.getmtime(path) > self.max_age:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def shared_signature(self):
+        # (mtime, size) of the database, which change whenever anyone saves to it (with a rollback journal, every commit goes straight into the file)
+        try:
+            stat = os.stat(self.shared_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def copy(self):
+        # Makes a new copy if the shared database has changed since the last one
+        with self.copying:
+            signature = self.shared_signature()
+            if signature is None:
+                raise FileNotFoundError(f"{self.shared_path} not found")  # Rather than connect() making a new empty database there
+            if signature == self.signature:
+                return
+
+            with self.lock:
+                applied = self.applied
+
+            path = os.path.join(self.local_dir, f"{self.prefix}{time.time_ns()}.db")
+            source = db_utils.connect(self.shared_path)
+            destination = sqlite3.connect(path)
+            try:
+                # The backup API gives a consistent snapshot even if someone is writing to it
+                source.backup(destination)
+                destination.execute("PRAGMA journal_mode = delete")  # The copy keeps the shared file's journal mode, so this undoes it if that was ever left in WAL mode
+            finally:
+                source.close()
+                destination.close()
+
+            with self.lock:
+                if self.latest and self.latest[0] != self.current:
+                    self.old.append(self.latest[0])  # Never used
+                self.latest = (path, applied)
+                self.signature = signature
+
+    def take(self):
+        # The path of a newer copy that has all of this operator's changes in it, or None if there isn't one
+        with self.lock:
+            if not self.latest or self.latest[0] == self.current or self.latest[1] < self.submitted:
+                return None
+            if self.current:
+                self.old.append(self.current)
+            self.current = self.latest[0]
+            return self.current
+
+    def discard_old(self):
+        # Call once the connection to the previous copy is closed
+        with self.lock:
+            for path in self.old:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.old = [path for path in self.old if os.path.exists(path)]
+
+    def close(self):
+        # Call once the connection to the current copy is closed
+        with self.lock:
+            self.old += [path for path in (self.current, self.latest and self.latest[0]) if path]
+        self.discard_old()
+
+    def submit(self, job):
+        # job(cur) is run against the shared database in the background
+        with self.lock:
+            self.pending.append(job)
+            self.submitted += 1
+        self.wake.set()
+
+    def flush(self, timeout=10):
+        # Waits (up to timeout seconds) for every queued change to be saved
+        self.wake.set()
+        end = time.monotonic() + timeout
+        while self.applied < self.submitted and time.monotonic() < end:
+            time.sleep(0.05)
+        return self.applied >= self.submitted
+
+    def apply(self, job):
+        # Each queued change is saved in its own transaction, so one that fails can't undo or hold up the others
+        if self.shared is None:
+            self.shared = db_utils.connect(self.shared_path)
+
+        db_utils.run_transaction(self.shared, job)
+
+    def save_pending(self):
+        # Saves the queued changes in order, stopping (to try again later) if the shared database is locked or can't be reached
+        while True:
+            with self.lock:
+                if not self.pending:
+                    return
+                job = self.pending[0]
+
+            try:
+                self.apply(job)
+            except Exception as e:
+                if self.shared is None or db_utils.is_locked(e) or isinstance(e, OSError):
+                    raise
+                # Not something waiting will fix (e.g. a table that's been removed), so it's dropped rather than blocking the changes after it
+                print(f"Warning: a change couldn't be saved to the shared database ({e})")
+
+            with self.lock:
+                del self.pending[0]
+                self.applied += 1
+
+    def run(self):
+        while True:
+            self.wake.wait(self.check_interval)
+            self.wake.clear()
 
-def get_multiline_input():
-    return sys.stdin.read()
+            try:
+                self.save_pending()
+                self.copy()
 
+            except Exception as e:
+                # e.g. locked or not synced - try again next time round
+                if not self.failing:
+                    print(f"Warning: can't reach the shared database ({e}). Changes will be saved once it's back.")
+                self.failing = True
 
-def get_difset():
-    cursor.execute(f"SELECT difset FROM differences WHERE id = 1")
-    result = cursor.fetchone()
+            else:
+                self.failing = False
 
-    # If the set exists, deserialize it back into a Python set
-    if result:
-        set_json = result[0]
-        my_set = set(json.loads(set_json))
-        return my_set
-    
-    else:
+def write(job):
+    """
+    Makes a change to the database: job(cur) is run on the local copy straight away (so it takes effect here immediately),
+    and queued to be saved to the shared database. Without a local replica, it's just saved to the shared database.
+    """
+    db_utils.run_transaction(conn, job)
+
+    if replica:
+        replica.submit(job)
+
+def reload_replica(table_name):
+    """
+    Switches to the newest copy of the shared database (if there is one), and to the newest RI table if one has been added.
+
+    Returns:
+        str: The table to copy from.
+    """
+    global conn, cursor, catalogue
+
+    path = replica.take()
+    if not path:
+        return table_name
+
+    conn.close()
+    conn = db_utils.connect(path, journal=None)
+    cursor = conn.cursor()
+    replica.discard_old()
+
+    version_hashes_cache.clear()
+    diff_cache.clear()
+
+    newest = get_highest_table() if table_name_highest_table else table_name
+    if newest != table_name:
+        print(f"{newest} has been added to the database - now copying from it.")
+
+    catalogue = RICatalogue(newest)
+    return newest
+
+
+#####################
+# Acknowledged changes
+# One row per version, code and operator, so acknowledging a code is a single insert and two people can't overwrite each other.
+# A change counts as checked once anyone has acknowledged it.
+#####################
+
+operator = getpass.getuser()
+
+def setup_acknowledged(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS acknowledged_changes (
+            version TEXT NOT NULL,
+            code TEXT NOT NULL,
+            operator TEXT NOT NULL,
+            PRIMARY KEY (version, code, operator)
+        ) WITHOUT ROWID
+    """)
+
+def acknowledge_change(version, code):
+    write(lambda cur: cur.execute("INSERT OR IGNORE INTO acknowledged_changes (version, code, operator) VALUES (?, ?, ?)", (version, code, operator)))
+
+def unacknowledge_change(version, code):
+    # Brings back the warning for code (for everyone)
+    cursor.execute("SELECT 1 FROM acknowledged_changes WHERE version = ? AND code = ?", (version, code))
+    if not cursor.fetchone():
+        return 0
+
+    write(lambda cur: cur.execute("DELETE FROM acknowledged_changes WHERE version = ? AND code = ?", (version, code)))
+    return 1
+
+def unacknowledged(version, codes):
+    # Which of codes nobody has acknowledged in version yet (one lookup on the primary key)
+    if not codes:
         return set()
 
-def update_difset(difset):
-    # Convert the set to a list, then to JSON for storage
-    set_json = json.dumps(list(difset))
-    
-    # Update if exists, insert otherwise
-    cursor.execute("""
-        INSERT INTO differences (id, difset)
-        VALUES (1, ?)
-        ON CONFLICT(id) DO UPDATE SET difset = excluded.difset
-    """, (set_json,))
-    
-    conn.commit()
+    cursor.execute(f"SELECT DISTINCT code FROM acknowledged_changes WHERE version = ? AND code IN ({', '.join('?' * len(codes))})", (version, *codes))
+    return set(codes) - {code for code, in cursor.fetchall()}
 
-def get_highest_table():
-    # Query the list of tables in the database
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+def get_versions():
+    # All the RI{yyyymmdd} tables (or views, once the database uses the version store) in the database, oldest first
+    cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view');")
     tables = cursor.fetchall()
 
     # Filter the tables that match the pattern 'RI{number}'
@@ -327,19 +326,387 @@ def get_highest_table():
     table_numbers = []
 
     for table in tables:
-        match = re.match(pattern, table[0])
+        match = re.fullmatch(pattern, table[0])
         if match:
             table_numbers.append(int(match.group(1)))  # Extract number part and convert to int
 
+    return [f"RI{number:08}" for number in sorted(table_numbers)]  # Format as RI followed by 8-digit number
+
+def get_highest_table():
+    versions = get_versions()
+
     # If there are any valid tables, return the table with the highest number
-    if table_numbers:
-        max_number = max(table_numbers)
-        return f"RI{max_number:08}"  # Format as RI followed by 8-digit number
+    if versions:
+        return versions[-1]
     else:
         return None  # No valid tables found
+
+def get_previous_table(table_name):
+    # The version before table_name (None if it's the first)
+    versions = get_versions()
+    if table_name not in versions:
+        return None
     
+    i = versions.index(table_name)
+    return versions[i-1] if i else None
+
+#####################
+# Version diffs
+# Each row of an RI table is hashed (title and description separately) and two versions are compared hash by hash.
+# The hashes are kept per table and the diffs per pair of tables, so they're only worked out once (until the table is edited).
+# This replaces the hand-maintained differences table (a json list of codes to check), which is no longer read or updated.
+# It's left in the database rather than dropped, as copies of older versions of this program still read it on startup.
+#####################
+
+version_hashes_cache = dict()
+diff_cache = dict()
+
+def content_hash(text):
+    return hashlib.blake2b((text or '').strip().encode('utf-8'), digest_size=16).digest()
+
+def version_hashes(table_name):
+    # {code: (title hash, description hash)} for every row in table_name
+    if table_name not in version_hashes_cache:
+        cursor.execute(f"SELECT code, title, description FROM {db_utils.identifier(table_name)}")
+        version_hashes_cache[table_name] = {code: (content_hash(title), content_hash(description)) for code, title, description in cursor.fetchall()}
+
+    return version_hashes_cache[table_name]
+
+def diff_versions(old_table, new_table):
+    """
+    Compares two RI tables.
+
+    Returns:
+        dict: Sets of the codes that were "added", "removed", "retitled" or had their "description" changed going from old_table to new_table.
+    """
+    key = (old_table, new_table)
+
+    if key not in diff_cache:
+        old = version_hashes(old_table)
+        new = version_hashes(new_table)
+
+        common = old.keys() & new.keys()
+        diff_cache[key] = {
+            "added": new.keys() - old.keys(),
+            "removed": old.keys() - new.keys(),
+            "retitled": {code for code in common if old[code][0] != new[code][0]},
+            "description": {code for code in common if old[code][1] != new[code][1]}
+        }
+
+    return diff_cache[key]
+
+def changed_codes(table_name):
+    # Codes that are new or have a different title/description in table_name compared to the version before it
+    previous = get_previous_table(table_name)
+    if not previous:
+        return set()
+
+    diff = diff_versions(previous, table_name)
+    return diff["added"] | diff["retitled"] | diff["description"]
+
+def forget_version(table_name):
+    # Call after table_name is edited so its hashes and diffs are worked out again
+    version_hashes_cache.pop(table_name, None)
+    for key in [key for key in diff_cache if table_name in key]:
+        del diff_cache[key]
+
+def print_diff(old_table, new_table):
+    diff = diff_versions(old_table, new_table)
+    print(f"Changes from {old_table} to {new_table}:")
+    for name, label in [("added", "Added"), ("removed", "Removed"), ("retitled", "Title changed"), ("description", "Description changed")]:
+        print(f"{label}: {orderCodes(diff[name]) if diff[name] else 'none'}")
+
+#####################
+# Version store
+# Instead of a full copy of every RI per version, each distinct title/description is saved once in ri_text (keyed by its hash),
+# and ri_history records which text each code had from which date (valid_from) until which date (valid_to, NULL if it's still current).
+# A new version only adds rows for the codes that changed. The RI{yyyymmdd} tables become views over the history, so everything that reads them still works.
+# Convert an existing database by running this program with --migrate-history
+#####################
+
+def version_date(version):
+    # RI20250306 -> 2025-03-06
+    number = version[2:]
+    return f"{number[:4]}-{number[4:6]}-{number[6:]}"
+
+def uses_version_store():
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='ri_history'")
+    return cursor.fetchone() is not None
+
+def is_version_view(table_name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='view' AND name=?", (table_name,))
+    return cursor.fetchone() is not None
+
+def setup_version_store():
+    # ri_text is a normal (rowid) table as the texts are too long to store well WITHOUT ROWID
+    cursor.execute("CREATE TABLE IF NOT EXISTS ri_text (hash TEXT PRIMARY KEY, text TEXT NOT NULL)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS ri_versions (version TEXT PRIMARY KEY, published TEXT NOT NULL UNIQUE) WITHOUT ROWID")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ri_history (
+            code TEXT NOT NULL,
+            valid_from TEXT NOT NULL,
+            valid_to TEXT,
+            title_hash TEXT NOT NULL REFERENCES ri_text(hash),
+            description_hash TEXT REFERENCES ri_text(hash),
+            PRIMARY KEY (code, valid_from)
+        ) WITHOUT ROWID
+    """)
+
+def store_texts(cur, texts):
+    # Saves any texts that aren't already stored, returning {text: hash}
+    hashes = {text: hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest() for text in set(texts) if text is not None}
+    cur.executemany("INSERT OR IGNORE INTO ri_text (hash, text) VALUES (?, ?)", [(h, text) for text, h in hashes.items()])
+    hashes[None] = None
+    return hashes
+
+def create_version_view(cur, version):
+    date = version_date(version)
+    cur.execute(f"""
+        CREATE VIEW {db_utils.identifier(version)} AS
+        SELECT h.code AS code, t.text AS title, d.text AS description
+        FROM ri_history h
+        JOIN ri_text t ON t.hash = h.title_hash
+        LEFT JOIN ri_text d ON d.hash = h.description_hash
+        WHERE h.valid_from <= '{date}' AND (h.valid_to IS NULL OR h.valid_to > '{date}')
+    """)
+
+def publish_version(cur, version, rows):
+    """
+    Adds a version to the version store (as part of the caller's transaction), only saving the codes that changed since the latest version.
+
+    Args:
+        version (str): The new version's name (e.g. RI20251101), which must be newer than the latest one.
+        rows (list): (code, title, description) for every RI in the new version.
+    """
+    date = version_date(version)
+
+    cur.execute("SELECT MAX(published) FROM ri_versions")
+    latest = cur.fetchone()[0]
+    if latest and latest >= date:
+        raise ValueError(f"{version} isn't newer than the latest version ({latest})")
+
+    hashes = store_texts(cur, [text for _, title, description in rows for text in (title, description)])
+    new = {code: (hashes[title], hashes[description]) for code, title, description in rows}
+
+    cur.execute("SELECT code, title_hash, description_hash FROM ri_history WHERE valid_to IS NULL")
+    current = {code: (title_hash, description_hash) for code, title_hash, description_hash in cur.fetchall()}
+
+    # Close off the codes that changed or were removed, and start new rows for the codes that changed or were added
+    cur.executemany("UPDATE ri_history SET valid_to = ? WHERE code = ? AND valid_to IS NULL", [(date, code) for code in current if new.get(code) != current[code]])
+    cur.executemany("INSERT INTO ri_history (code, valid_from, valid_to, title_hash, description_hash) VALUES (?, ?, NULL, ?, ?)", [(code, date, *new[code]) for code in new if current.get(code) != new[code]])
+
+    cur.execute("INSERT INTO ri_versions (version, published) VALUES (?, ?)", (version, date))
+    create_version_view(cur, version)
+
+def split_history(cur, code, date):
+    # Makes sure no history row of code spans date (one ends and the next starts there instead)
+    cur.execute("SELECT valid_from, valid_to, title_hash, description_hash FROM ri_history WHERE code = ? AND valid_from < ? AND (valid_to IS NULL OR valid_to > ?)", (code, date, date))
+    row = cur.fetchone()
+
+    if row:
+        valid_from, valid_to, title_hash, description_hash = row
+        cur.execute("UPDATE ri_history SET valid_to = ? WHERE code = ? AND valid_from = ?", (date, code, valid_from))
+        cur.execute("INSERT INTO ri_history (code, valid_from, valid_to, title_hash, description_hash) VALUES (?, ?, ?, ?, ?)", (code, date, valid_to, title_hash, description_hash))
+
+def edit_version_row(cur, version, code, title=None, description=None, delete=False):
+    """
+    Changes (or deletes) one code in one version of the version store, leaving every other version as it was.
+
+    Returns:
+        int: 1 if the code was in the version before the edit, otherwise 0.
+    """
+    date = version_date(version)
+    cur.execute("SELECT MIN(published) FROM ri_versions WHERE published > ?", (date,))
+    next_date = cur.fetchone()[0]
+
+    split_history(cur, code, date)
+    if next_date:
+        split_history(cur, code, next_date)
+
+    cur.execute("DELETE FROM ri_history WHERE code = ? AND valid_from = ?", (code, date))
+    existed = cur.rowcount
+
+    if not delete:
+        hashes = store_texts(cur, [title, description])
+        cur.execute("INSERT INTO ri_history (code, valid_from, valid_to, title_hash, description_hash) VALUES (?, ?, ?, ?, ?)", (code, date, next_date, hashes[title], hashes[description]))
+
+    return existed
+
+def getRI_as_of(code, date):
+    """
+    Gets an RI as it was on a date (yyyy-mm-dd).
+
+    Returns:
+        tuple: The title and description, or (None, None) if the code didn't exist then.
+    """
+    if uses_version_store():
+        cursor.execute("""
+            SELECT t.text, d.text
+            FROM ri_history h
+            JOIN ri_text t ON t.hash = h.title_hash
+            LEFT JOIN ri_text d ON d.hash = h.description_hash
+            WHERE h.code = ? AND h.valid_from <= ? AND (h.valid_to IS NULL OR h.valid_to > ?)
+        """, (code, date, date))
+        result = cursor.fetchone()
+        return result if result else (None, None)
+
+    versions = [version for version in get_versions() if version_date(version) <= date]
+    return getRI(code, versions[-1]) if versions else (None, None)
+
+def migrate_to_version_store():
+    # Moves every RI{yyyymmdd} table into the version store (in one go, so nothing changes if it fails) and shrinks the file
+    setup_version_store()
+    conn.commit()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    tables = {name for name, in cursor.fetchall()}
+    versions = [version for version in get_versions() if version in tables]
+
+    if not versions:
+        print("There are no RI tables to move into the version store.")
+        return
+
+    size = os.path.getsize(db_path)
+
+    with db_utils.transaction(conn) as cur:
+        for version in versions:
+            cur.execute(f"SELECT code, title, description FROM {db_utils.identifier(version)}")
+            rows = cur.fetchall()
+            cur.execute(f"DROP TABLE {db_utils.identifier(version)}")
+            publish_version(cur, version, rows)
+
+    cursor.execute("VACUUM")  # Rewrites the file without the space the dropped tables used
+
+    cursor.execute("SELECT COUNT(*) FROM ri_history")
+    print(f"Moved {len(versions)} versions into the version store ({cursor.fetchone()[0]} history rows). {size // 1024}KB -> {os.path.getsize(db_path) // 1024}KB")
+
+#####################
+# Importing a new version
+# Run this program with --import master_list.xlsx (or .csv/.json, with code, title and description columns/keys) to publish it as a new RI{yyyymmdd} version.
+# The whole list is checked first, then written in one transaction, so nobody ever sees a half-imported version.
+# An empty list is refused, and so is one missing more than max_removed_share of the latest version's codes (usually the wrong file or sheet),
+# unless --allow-removals is given.
+#####################
+
+max_removed_share = 0.25
+
+def read_master_list(path):
+    # (code, title, description) for every row of an xlsx, csv or json master list. Raises ValueError if the file isn't laid out as one
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == ".json":
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            # {code: {"title": ..., "description": ...}}
+            if not all(isinstance(entry, dict) for entry in data.values()):
+                raise ValueError("each code should map to an object with a title and description")
+            data = [dict(entry, code=code) for code, entry in data.items()]
+        if not isinstance(data, list) or not all(isinstance(entry, dict) for entry in data):
+            raise ValueError("it should be a list of objects with a code, title and description")
+        records = [{str(key).lower(): value for key, value in entry.items()} for entry in data]
+
+    elif extension in (".xlsx", ".xlsm"):
+        try:
+            import openpyxl
+        except ImportError:
+            raise SystemExit("Importing an xlsx needs openpyxl (pip install openpyxl). Otherwise save it as a csv.")
+        sheet = openpyxl.load_workbook(path, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        first = next(rows, None)
+        if first is None:
+            raise ValueError("the sheet is empty")
+        header = [str(cell or '').strip().lower() for cell in first]
+        records = [dict(zip(header, row)) for row in rows if any(cell is not None for cell in row)]
+
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            records = [{(key or '').strip().lower(): value for key, value in row.items()} for row in csv.DictReader(f)]
+
+    return [(record.get("code"), record.get("title"), record.get("description")) for record in records]
+
+def validate_master_list(rows):
+    """
+    Tidies up the rows of a master list and checks them.
+
+    Returns:
+        tuple: The cleaned (code, title, description) rows, and a list of problems (empty if there are none).
+    """
+    cleaned = []
+    problems = []
+    seen = set()
+
+    for i, (code, title, description) in enumerate(rows, start=2):
+        code = str(code or '').strip().upper()
+        title = str(title or '').strip()
+        description = str(description or '').strip() or None
+
+        if not re.fullmatch(r"[MA]\d{3}", code):
+            problems.append(f"Row {i}: invalid code '{code}'")
+        elif code in seen:
+            problems.append(f"Row {i}: {code} is in the list more than once")
+        if not title:
+            problems.append(f"Row {i}: {code} has no title")
+
+        seen.add(code)
+        cleaned.append((code, title, description))
+
+    if not cleaned:
+        problems.append("There are no risk improvements in the list")
+
+    return cleaned, problems
+
+def import_master_list(path, version=None, allow_removals=False):
+    version = version or f"RI{date.today():%Y%m%d}"
+    if not re.fullmatch(r"RI\d{8}", version):
+        print(f"Invalid version name {version} (should be RI followed by the date, e.g. RI20251101)")
+        return 0
+
+    try:
+        rows, problems = validate_master_list(read_master_list(path))
+    except ValueError as e:  # Includes a json file that isn't valid json
+        rows, problems = [], [f"Can't read it: {e}"]
+
+    if problems:
+        print(f"Nothing imported, {len(problems)} problem(s) with {path}:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 0
+
+    previous = get_highest_table()
+    if previous and previous >= version:
+        print(f"Nothing imported, {version} isn't newer than the latest version ({previous})")
+        return 0
+
+    if previous and not allow_removals:
+        removed = set(version_hashes(previous)) - {code for code, _, _ in rows}
+        if len(removed) > max_removed_share * len(version_hashes(previous)):
+            print(f"Nothing imported, {len(removed)} of the {len(version_hashes(previous))} codes in {previous} aren't in {path}: {orderCodes(removed)[:20]}")
+            print("Check it's the right file (and sheet). If they really have been removed, run the import again with --allow-removals.")
+            return 0
+
+    # The write lock is taken up front, so another import can't start halfway through this one
+    store = uses_version_store()
+    with db_utils.transaction(conn) as cur:
+        if store:
+            publish_version(cur, version, rows)
+        else:
+            cur.execute(f"""
+                CREATE TABLE {db_utils.identifier(version)} (
+                    code TEXT PRIMARY KEY NOT NULL,
+                    title TEXT NOT NULL,
+                    description TEXT
+                )
+            """)
+            cur.executemany(f"INSERT INTO {db_utils.identifier(version)} (code, title, description) VALUES (?, ?, ?)", rows)
+
+    print(f"Published {len(rows)} risk improvements as {version}")
+    if previous:
+        print_diff(previous, version)
+    return 1
+
 def getRI(code, table_name):
-    query = f"SELECT title, description FROM {table_name} WHERE code = ?"
+    query = f"SELECT title, description FROM {db_utils.identifier(table_name)} WHERE code = ?"
     cursor.execute(query, (code,))
 
     result = cursor.fetchone()
@@ -348,6 +715,161 @@ def getRI(code, table_name):
 
     return result
 
+class RICatalogue:
+    """
+    The active RI table, loaded into memory once so codes can be looked up without going back to the database.
+    The clipboard text for each combination of codes and settings is kept once it has been made, so repeat requests cost nothing.
+    """
+    max_rendered = 1024  # Rendered texts kept before the cache starts again
+    max_prefix = 12  # Longest title word prefix kept for suggestions
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.load()
+
+    def load(self):
+        # Call again after editing the table
+        cursor.execute(f"SELECT code, title, description FROM {db_utils.identifier(self.table_name)}")
+        self.rows = {code: (title, description) for code, title, description in cursor.fetchall()}
+        self.rendered = {}
+        self.index = None  # Search index, made the first time it's needed
+        self.build_prefixes()
+
+    def get(self, code):
+        return self.rows.get(code, (None, None))
+
+    def lookup(self, codes):
+        """
+        Looks up a batch of codes at once.
+
+        Returns:
+            tuple: [(code, title, description)] for the codes in the table (in the order given), and the list of codes that aren't.
+        """
+        found = []
+        invalid = []
+        for code in codes:
+            title, description = self.get(code)
+            if title or description:
+                found.append((code, title, description))
+            else:
+                invalid.append(code)
+
+        return found, invalid
+
+    def build_prefixes(self):
+        # Every start of every code (upper case, e.g. M, M0, M06, M069) and title word (lower case) -> the codes with it, in order
+        prefixes = {}
+        for code in orderCodes(self.rows):
+            keys = {code[:i] for i in range(1, len(code) + 1)}
+            for word in re.findall(r"\w+", (self.rows[code][0] or '').lower()):
+                keys.update(word[:i] for i in range(1, min(len(word), self.max_prefix) + 1))
+            for key in keys:
+                prefixes.setdefault(key, []).append(code)
+
+        self.prefixes = prefixes
+
+    def complete(self, prefixes, limit=8):
+        """
+        Finds the codes that have every one of prefixes (upper case for the start of a code, lower case for the start of a title word), in order.
+        Only looks in memory, so it's quick enough to run on every keystroke.
+        """
+        lists = sorted((self.prefixes.get(prefix[:self.max_prefix], []) for prefix in prefixes), key=len)
+        if not lists:
+            return []
+
+        others = [set(codes) for codes in lists[1:]]
+        matches = []
+        for code in lists[0]:
+            if all(code in other for other in others):
+                matches.append(code)
+                if len(matches) == limit:
+                    break
+
+        return matches
+
+    def build_index(self):
+        # An in-memory FTS5 table over the titles and descriptions (falls back to a plain scan if this sqlite doesn't have FTS5)
+        index = sqlite3.connect(":memory:", check_same_thread=False)
+        try:
+            index.execute("CREATE VIRTUAL TABLE ri_search USING fts5(code UNINDEXED, title, description, tokenize='porter unicode61')")
+        except sqlite3.OperationalError:
+            index.close()
+            return False
+
+        index.executemany("INSERT INTO ri_search (code, title, description) VALUES (?, ?, ?)", [(code, title, description or '') for code, (title, description) in self.rows.items()])
+        index.commit()
+        return index
+
+    def search(self, text, limit=10):
+        """
+        Finds the RIs whose title or description contain every word of text (the last word can be partial), best matches first.
+
+        Returns:
+            list: (code, title, snippet) for each match, with the matching words in the snippet [bracketed].
+        """
+        words = re.findall(r"\w+", text.lower())
+        if not words:
+            return []
+
+        if self.index is None:
+            self.index = self.build_index()
+
+        if not self.index:
+            return self.scan(words, limit)
+
+        # Quoting each word stops it being read as FTS syntax (e.g. OR, NEAR)
+        query = " ".join(f'"{word}"' for word in words) + "*"
+        return self.index.execute("""
+            SELECT code, title, snippet(ri_search, 2, '[', ']', '...', 12)
+            FROM ri_search WHERE ri_search MATCH ?
+            ORDER BY bm25(ri_search, 0, 5.0, 1.0) LIMIT ?
+        """, (query, limit)).fetchall()
+
+    def scan(self, words, limit):
+        # Search without FTS5: every word has to appear somewhere, with matches in the title first
+        hits = []
+        for code, (title, description) in self.rows.items():
+            title_lower, description_lower = title.lower(), (description or '').lower()
+            if all(word in title_lower or word in description_lower for word in words):
+                hits.append((-sum(word in title_lower for word in words), code, title))
+
+        return [(code, title, '') for _, code, title in sorted(hits)[:limit]]
+
+    def render(self, codes, settings, additional_info):
+        """
+        Gets the clipboard text for codes (already looked up and valid) with the current header/dash/additional info settings.
+
+        Returns:
+            tuple: The text for each code, and all of them joined ready to copy.
+        """
+        additional = tuple(additional_info.get(code, '') if settings["additional_info"] else '' for code in codes)
+        key = (tuple(codes), settings["codeHeader"], settings["autoDash"], additional)
+
+        if key not in self.rendered:
+            if len(self.rendered) >= self.max_rendered:
+                self.rendered.clear()
+            texts = tuple(renderRI([(code, *self.rows[code]) for code in codes], additional, settings))
+            self.rendered[key] = (texts, '\n+\n'.join(texts))
+
+        return self.rendered[key]
+
+def renderRI(entries, additional, settings):
+    # entries is [(code, title, description)], with the additional info for each code (or '') in additional
+    titles = [title for _, title, _ in entries]
+    texts = []
+
+    for (code, title, description), info in zip(entries, additional):
+        if settings["codeHeader"] and len(titles) == 1:
+            text = f"{code}{f" (\"{info}\")" if info else ''}\n-\n{title}{f"\n-\n{description}" if description else ''}"
+        elif settings["autoDash"] and title == titles[0]:
+            text = f"{f"(\"{info}\")\n-\n" if info else '\n-\n'}{title}{f"\n-\n{description}" if description else ''}"
+        else:
+            text = f"{f"(\"{info}\")\n-\n" if info else ''}{title}{f"\n-\n{description}" if description else ''}"
+
+        texts.append(text)
+
+    return texts
+
 def hline():
     print("----------------------")
 
@@ -363,6 +885,7 @@ This program is designed to take in an RI code, and return the RI text straight
 Things to note:
     - There is no case sensitivity (e.g. M094 and m094 will be read the same, as will z and Z).
     - The settings and controls panel is optional - all functionality can be accessed just through the input text box via letter codes.
+    - As you type a code (or ?keywords), matching RIs are suggested under the input box, marked if they're to copy, copied, or changed in this version.
     - This is taking risk improvement text from risk_improvements.db  (a SQLite database) (saved in Administration/Programs/Databases)
         - Updating and creating databases is outlined in RI_database_setup.py (also saved in Administration/Programs/Databases)
 
@@ -379,11 +902,15 @@ This additional info is printed, bracketted and in quotation marks, next to the
           
 -----Instructions-----
 Next (x): Output the next RI in the codes to copy list. The list will always be ordered Ms then As, sorted numerically
-Auto Setup (z): Copy all the flagged items at once and paste into the input box. Once you've pasted, press ctrl-enter or click the submit button. The program goes through and looks for A(xxx) and M(xxx) codes and adds them to the codes to copy list. 
+Auto Setup (z): Copy all the flagged items at once and paste into the input box. Once you've pasted, press ctrl-enter or click the submit button. The program goes through and looks for A(xxx) and M(xxx) codes and adds them to the codes to copy list. Any comments under a code are saved as its additional info (you can also paste an iAuditor CSV or JSON export). 
 Please note that using the auto setup will clear all current codes. To add a code to the list, use the manual setup.  
 Manual Setup (s): Add the codes to the list one by one, pressing enter after each code.
 Show copied codes (c): Show the codes that you have copied. 
 Finish (f): Press this (or enter f) after you have finished getting all the codes for a certain job. This resets the codes to copy list as well as the warning system.
+Search (?): Type ? and then some keywords (e.g. ?pizza oven flue) to find the risk improvements that mention them. Then type ?1, ?2, etc to copy one of the results.
+History (@): Type @ then a code and date (e.g. @M069 2025-05-01) to see what that RI said on that date.
+Differences (d): Show which codes were added, removed or changed since the previous version of the database. Type e.g. "d RI20250306 RI20250901" to compare any two versions.
+When you copy a code that has changed since the previous version, you'll be asked to check it. Type '(' and then the code (e.g. (M094) once you have, to stop everyone being warned about it. Type ')' and then the code (e.g. )M094) to bring the warning back.
           
 -------Settings-------
 Header (h): Toggle whether the output contains the RI code at the top.
@@ -413,6 +940,9 @@ def help():
     print("c (copied): Display the codes you have copied so far")
     print("t (tocopy): Display what codes you have left to copy")
     print("f (finished): Display what codes have not been copied from the list. Also resets the list of codes to copy.")
+    print("?{keywords}: Search the risk improvements for keywords (e.g. ?switchboard). Then ?1, ?2, etc copies that result")
+    print("@{code} {yyyy-mm-dd}: Display an RI as it was on a date (e.g. @M069 2025-05-01)")
+    print("d (diff): Display what codes have changed since the previous version of the database (worked out by comparing the RI tables). d {version} {version} compares any two versions.")
     print("w (warnings): Turn warnings off")
     print("p (print): Toggle whether to show the full risk recommendation text after entering a code (will copy all of it no matter what)")
     print("AAA or MMM: This automatically adds the letter code, allowing you to just enter the numbers. Enter 'r' to exit. Note that codes DO still work. e.g. Mf will finish")
@@ -423,89 +953,191 @@ def help():
     hline()
 
 def orderCodes(code_set):
-    sorted_codes = sorted(code_set, key=lambda x: (x[0] == "A", int(x[1:])))
+    # Anything that isn't a letter and number (e.g. DNA in old versions) goes last
+    sorted_codes = sorted(code_set, key=lambda x: (not x[1:].isdigit(), x[0] == "A", int(x[1:]) if x[1:].isdigit() else 0, x))
 
     return sorted_codes
 
-def autoExtract(text):
-    pattern = r'\b[M|A]\d{3}\b'  
-    matches = re.findall(pattern, text)  # Find all matches
-
-    counts = Counter(matches)
-    duplicates = {code: count for code, count in counts.items() if count > 1}
-
-    if duplicates:
-        formatted = ", ".join(f"({code}:{count}x)" for code, count in duplicates.items())
-        print(f"Duplicates: {formatted}")
+#####################
+# Flagged items
+# Auto Setup reads the flagged items pasted from iAuditor (or an iAuditor CSV/JSON export) in one pass, picking up:
+#   - the RI codes (M/A followed by 3 numbers)
+#   - the section heading each one is under
+#   - the consultant's comments under each one, which are saved as its additional info (unless you've already typed some with &CODE)
+# The pasted text is read a line at a time (no upper-cased or split copies of it), so pasting a very long report is fine.
+#
+# In the flagged items text, each item looks like:
+#       SECTION HEADING            (all capitals)
+#       Question text (M069)
+#       Answer                     (the first line after the question)
+#       Any comments               (everything else until the next question or heading)
+#####################
 
-    return len(matches), set(matches)
+code_pattern = re.compile(r'\b[MA]\d{3}\b', re.IGNORECASE)
+media_pattern = re.compile(r'(photo|image|media|signature)\s*\d*$', re.IGNORECASE)
+
+def iter_lines(text):
+    # Yields each line of text without making a list of them all
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start)
+        if end == -1:
+            end = len(text)
+        yield text[start:end].rstrip('\r')
+        start = end + 1
+
+def new_flagged():
+    # matches is every code in the order found (duplicates included), sections and comments are by code
+    return {"matches": [], "sections": {}, "comments": {}}
+
+def add_flagged(flagged, codes, heading, comment=''):
+    for code in codes:
+        code = code.upper()
+        flagged["matches"].append(code)
+        if heading:
+            flagged["sections"].setdefault(code, heading)
+        if comment:
+            flagged["comments"].setdefault(code, []).append(comment)
+
+def is_failed(value):
+    # Blank means the export doesn't say, so the item is kept
+    return str(value).strip().lower() not in ('false', '0', 'no')
+
+def parse_flagged_text(lines):
+    flagged = new_flagged()
+    heading = None
+    current = []  # Codes of the item the comments belong to
+    answered = False
+
+    lines = (line.strip() for line in lines)
+    lines = (line for line in lines if line and not media_pattern.match(line))
+
+    # One line of lookahead (following), which is all the heading check below needs
+    line = next(lines, None)
+    while line is not None:
+        following = next(lines, None)
+        codes = code_pattern.findall(line)
+        if codes:
+            add_flagged(flagged, codes, heading)
+            current = [code.upper() for code in codes]
+            answered = False
+        elif current and not answered:
+            answered = True
+        elif line.isupper() and (not current or (following is not None and code_pattern.search(following))):
+            # Comments like "N/A" or "RCD OK" are uppercase too, so while an item is
+            # open only a line followed by another item counts as a heading
+            heading = line
+            current = []
+        elif current:
+            for code in current:
+                flagged["comments"].setdefault(code, []).append(line)
+
+        line = following
+
+    return flagged
+
+def parse_flagged_csv(lines):
+    flagged = new_flagged()
+    heading = None
+    reader = csv.reader(lines)
+    columns = {name.strip().lower(): i for i, name in enumerate(next(reader, []))}
+
+    def column(row, *names):
+        for name in names:
+            if name in columns and columns[name] < len(row):
+                return row[columns[name]].strip()
+        return ''
+
+    for row in reader:
+        label = column(row, 'label', 'question', 'item')
+        if column(row, 'itemtype', 'item type', 'type').lower() in ('section', 'category'):
+            heading = label
+            continue
 
-def autoSetUp(lists, settings):
-    global warnings_allowed
-    print("Paste text and then press the Submit button (or press ctrl-enter)")
+        codes = code_pattern.findall(label)
+        if codes and is_failed(column(row, 'failedresponse', 'failed', 'flagged')):
+            add_flagged(flagged, codes, heading, column(row, 'comment', 'comments', 'notes', 'note'))
 
-    text = get_multiline_input().upper()
+    return flagged
 
-    count, codes = autoExtract(text)
-    set_count = len(codes)
+def parse_flagged_json(text):
+    # The whole export is one json document, so it is loaded in one go, then each item is looked at once
+    data = json.loads(text)
+    items = data if isinstance(data, list) else data.get("header_items", []) + data.get("items", [])
 
-    print(f"{set_count} unique codes from {count} total.")
-    print(orderCodes(codes))
+    flagged = new_flagged()
+    headings = {}
 
-    settings["warnings"] = True
-    warnings_allowed = True
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        label = (item.get("label") or '').strip()
+        if item.get("type") in ('section', 'category'):
+            headings[item.get("item_id")] = label
+            continue
 
-    lists["toCopy"] = codes
+        responses = item.get("responses") or {}
+        codes = code_pattern.findall(label)
+        if codes and is_failed(responses.get("failed", '')):
+            add_flagged(flagged, codes, headings.get(item.get("parent_id")), (responses.get("text") or item.get("comment") or '').strip())
 
-def setUp(lists, settings):
-    print("Please enter the full list of codes to copy for then press Manual Setup again once finished (or press 's')")
-    app.setup_disability()
-    i = 0
+    return flagged
 
-    preCode = ""
+def parse_flagged_items(text):
+    """
+    Reads flagged items pasted from iAuditor, or an iAuditor CSV or JSON export (worked out from the text).
 
-    while True:
-        print(preCode, end="")
+    Returns:
+        dict: matches (every code found, in order), sections (heading for each code) and comments (comment for each code, as one line).
+    """
+    lines = iter_lines(text)
+    first = next((line for line in lines if line.strip()), '')
 
-        inp = get_input().upper()
-        if inp == 'DONE' or inp == 'D' or inp == 'S':
-            break
+    if first.lstrip().startswith(('{', '[')):
+        try:
+            flagged = parse_flagged_json(text)
+        except ValueError:
+            # Not an export after all (e.g. a pasted report that starts with a bracket), so it's read as pasted text
+            print("Warning: the flagged items look like JSON but aren't valid JSON, so they've been read as pasted text.")
+            flagged = parse_flagged_text(iter_lines(text))
+    elif 'label' in [name.strip().lower() for name in next(csv.reader([first]), [])]:
+        flagged = parse_flagged_csv(itertools.chain([first], lines))
+    else:
+        flagged = parse_flagged_text(itertools.chain([first], lines))
 
-        if inp == "MMM":
-            preCode = 'M'
-            continue
+    flagged["comments"] = {code: ' '.join(comments) for code, comments in flagged["comments"].items()}
+    return flagged
 
-        if inp == "AAA":
-            preCode = 'A'
-            continue
+def autoSetUp(text, lists, settings, additional_info):
+    global warnings_allowed
 
-        if inp[0] == 'R':
-            preCode = ""
-            continue
+    flagged = parse_flagged_items(text)
+    matches = flagged["matches"]
+    codes = set(matches)
 
-        codeInp = preCode + inp
+    duplicates = {code: count for code, count in Counter(matches).items() if count > 1}
+    if duplicates:
+        formatted = ", ".join(f"({code}:{count}x)" for code, count in duplicates.items())
+        print(f"Duplicates: {formatted}")
 
-        pattern = r'\b(?:M|A)\d{3}\b'
-        
-        if not re.fullmatch(pattern, codeInp):
-            print("Invalid code.")
-            continue
+    print(f"{len(codes)} unique codes from {len(matches)} total.")
 
-        if codeInp in lists["toCopy"]:
-            hline()
-            print(f"{codeInp} already entered")
-            hline()
+    by_section = {}
+    for code in orderCodes(codes):
+        by_section.setdefault(flagged["sections"].get(code, ''), []).append(code)
+    for heading, section_codes in by_section.items():
+        print(f"{heading}: {section_codes}" if heading else section_codes)
 
-        else: 
-            lists["toCopy"].add(codeInp)
-        
-        i += 1
+    added = [code for code in orderCodes(flagged["comments"]) if code not in additional_info]
+    for code in added:
+        additional_info[code] = flagged["comments"][code]
+    if added:
+        print(f"Comments saved as additional info for {added} (type &CODE to change one)")
 
-    app.enable_all_instruction_buttons()
     settings["warnings"] = True
-    global warnings_allowed
     warnings_allowed = True
-    print(f"{len(lists["toCopy"])} unique codes to copy: {orderCodes(lists["toCopy"])} ({i} codes entered)")
+
+    lists["toCopy"] = codes
 
 def lazy():
     hline()
@@ -530,354 +1162,749 @@ Then, once there are no images left. Press t then enter to see if there are any
           """)
     hline()
 
-def parseInstruction(code, lists, settings, table_name):
-    global warnings_allowed
-
-    if code[0] == 'P':
-        settings["showRI"] = not settings["showRI"]
-        print(f"The full risk recommendation will {'' if  settings["showRI"] else 'NOT'} be printed to the screen")
-        app.sync_checkboxes(settings)
-        return 1
-    
-    if code[0] == 'O':
-        settings["allWarnings"] = not settings["allWarnings"]
-        print(f"Debug mode {'on' if settings["allWarnings"] else 'off'}.")
-        app.sync_checkboxes(settings)
-        return 1
-        
-    if code[0] == 'C':
-        print(f"So far, you have copied {orderCodes(lists["copied"])}")
-        return 1
+def search(text):
+    global search_hits
+    hits = catalogue.search(text)
+    search_hits = [code for code, _, _ in hits]
 
-    if code[0] == 'T':
-        print(f"You still have the following codes left: {orderCodes(lists["toCopy"])}")
-        return 1
-    
-    if code == 'HELP':
-        help()
-        return 1
-    
-    if code == 'EXAMPLE':
-        lazy()
-        return 1
-
-    if code[0] == 'H':
-        settings["codeHeader"] = not settings["codeHeader"]
-        print(f"codeHeader is now {'on' if settings["codeHeader"] else 'off'}")
-        app.sync_checkboxes(settings)
-        return 1
-    
-    if code[0] == 'S':
-        setUp(lists, settings)
-        return 1
+    if not hits:
+        print(f"No risk improvements found for \"{text.strip()}\"")
+        return
 
-    if code[0] == 'F':
-        return 0
-    
-    if code[0] == 'W':
-        if warnings_allowed:
-            settings["warnings"] = not settings["warnings"]
-        else:
-            settings["warnings"] = False
-            print("You cannot turn warnings on without codes to copy.")
-        print(f"Warnings now {'on' if settings["warnings"] else 'off'}.")
-        app.sync_checkboxes(settings)
-        return 1
-    
-    if code[0] == 'E':
-        editDB(table_name)
-        return 1
+    x = 1
+    for code, title, snippet in hits:
+        print(f"{x}. {code}: {' '.join(title.split())}")
+        if snippet:
+            print(f"      {' '.join(snippet.split())}")
+        x += 1
+    print("Type ?1, ?2, etc to copy one.")
 
-    if code[0] == 'Z':
-        autoSetUp(lists, settings)
-        return 1
-    
-    if code[0] == 'I':
-        settings['additional_info'] = not settings['additional_info']
-        print(f"Additional info is now {'on' if settings["additional_info"] else 'off'}")
-        app.sync_checkboxes(settings)
-        return 1
-    
-    if code[0] == '-':
-        settings['autoDash'] = not settings['autoDash']
-        print(f"Auto dash is now {'on' if settings["autoDash"] else 'off'}")
-        app.sync_checkboxes(settings)
-        return 1
-    
-    else:
-        print("Invalid instruction")
-        return 1
-    
 def setRI(code, title, description, table_name):
-    # Check if the code already exists
-    query = f"SELECT 1 FROM {table_name} WHERE code = ?"
-    cursor.execute(query, (code,))
-    exists = cursor.fetchone()
-
-    if exists:
-        # Update existing entry
-        query = f"UPDATE {table_name} SET title = ?, description = ? WHERE code = ?"
-        cursor.execute(query, (title, description, code))
-    else:
-        # Insert new entry
-        query = f"INSERT INTO {table_name} (code, title, description) VALUES (?, ?, ?)"
-        cursor.execute(query, (code, title, description))
+    view = is_version_view(table_name)
+
+    def save(cur):
+        if view:
+            edit_version_row(cur, table_name, code, title, description)
+            return
+
+        # Check if the code already exists
+        query = f"SELECT 1 FROM {db_utils.identifier(table_name)} WHERE code = ?"
+        cur.execute(query, (code,))
+        exists = cur.fetchone()
+
+        if exists:
+            # Update existing entry
+            query = f"UPDATE {db_utils.identifier(table_name)} SET title = ?, description = ? WHERE code = ?"
+            cur.execute(query, (title, description, code))
+        else:
+            # Insert new entry
+            query = f"INSERT INTO {db_utils.identifier(table_name)} (code, title, description) VALUES (?, ?, ?)"
+            cur.execute(query, (code, title, description))
 
-    conn.commit()
+    write(save)
+    catalogue.load()
+    forget_version(table_name)
 
 def deleteRI(code, table_name):
-    query = f"DELETE FROM {table_name} WHERE code = ?"
-    cursor.execute(query, (code,))
+    title, description = getRI(code, table_name)
     
-    if cursor.rowcount == 0:
+    if not title and not description:
         print("Error: Code does not exist.")
         return 0
+
+    view = is_version_view(table_name)
+
+    def delete(cur):
+        if view:
+            edit_version_row(cur, table_name, code, delete=True)
+        else:
+            query = f"DELETE FROM {db_utils.identifier(table_name)} WHERE code = ?"
+            cur.execute(query, (code,))
     
-    conn.commit()  # Save changes
+    write(delete)  # Save changes
+    catalogue.load()
+    forget_version(table_name)
     print(f"Successfully deleted code: {code}")
     return 1
 
-def editDB(table_name):
-    code = get_input("Enter code to edit/create or 'del' to delete a code").upper().strip()
+#####################
+# Batch mode
+# Run this program with --batch {folder} to prepare the RIs for a whole folder of jobs at once, without the window.
+# Each .txt, .csv or .json file in the folder should be the flagged items text for one job (what you would paste for Auto Setup), or an iAuditor CSV or JSON export.
+# Anything else in the folder is ignored, and a job that can't be read is reported at the end rather than stopping the others.
+# For each one, {job}_RIs.txt is saved (in the same folder, or --output {folder}) with every RI for the job in order, ready to paste.
+# The consultant's comments are put in as additional info. --no-comments, --no-header and --dash work like the Additional Info, Header and Dash settings. Jobs are shared between processes (--workers, defaults to one per CPU).
+#####################
 
-    if code == 'DEL':
-        code = get_input("Enter a code to delete:").upper().strip()
-        if not deleteRI(code, table_name):
-            return 0
+batch_rows = None
+batch_changed = None
+batch_extensions = ('.txt', '.csv', '.json')
 
-    title, description = getRI(code, table_name)
+def start_batch_worker(rows, changed):
+    # Each worker process is given the RIs once, rather than with every job
+    global batch_rows, batch_changed
+    batch_rows = rows
+    batch_changed = changed
 
-    if not title or not description:
-        if get_input("Code not found. Would you like to make a new entry? 'y' then enter for yes, anything else for no.").lower().strip() != 'y':
-            return 0
-        
-    print(f"Editing database for {code}:")
-    print(f"Current title: {title}")
-    print("Write \"keep\", then enter > ctrl-Z > enter to keep, or write/paste corrected title, then enter > ctrl-Z > enter")
+def prepare_job(path, output_dir, settings):
+    # Never raises, so one bad file can't stop the rest of the batch (its error is reported with the results instead)
+    try:
+        return write_job(path, output_dir, settings)
+    except Exception as e:
+        return {"job": os.path.basename(path), "error": f"{type(e).__name__}: {e}"}
+
+def write_job(path, output_dir, settings):
+    """
+    Writes the RIs for one job's flagged items to {output_dir}/{job}_RIs.txt.
+
+    Returns:
+        dict: The job's codes, invalid codes, duplicates, changed codes that haven't been checked, and where it was saved.
+    """
+    with open(path, encoding='utf-8', errors='replace') as f:
+        flagged = parse_flagged_items(f.read())
+
+    matches = flagged["matches"]
+    codes = orderCodes(set(matches))
+    valid = [code for code in codes if code in batch_rows]
+
+    texts = [renderRI([(code, *batch_rows[code])], (flagged["comments"].get(code, '') if settings["additional_info"] else '',), settings)[0] for code in valid]
+
+    output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + "_RIs.txt")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("\n\n".join(texts) + "\n")
+
+    return {
+        "job": os.path.basename(path),
+        "codes": valid,
+        "invalid": [code for code in codes if code not in batch_rows],
+        "duplicates": {code: count for code, count in Counter(matches).items() if count > 1},
+        "changed": [code for code in valid if code in batch_changed],
+        "output": output_path
+    }
 
-    titleInp = get_multiline_input()
+def batch(input_dir, output_dir=None, settings=None, workers=None):
+    global conn, cursor
+    output_dir = output_dir or input_dir
+    os.makedirs(output_dir, exist_ok=True)
+    settings = settings or {"codeHeader": True, "autoDash": False, "additional_info": True}
 
-    newTitle = title if titleInp.lower() == "keep" else titleInp
+    jobs = sorted(os.path.join(input_dir, name) for name in os.listdir(input_dir)
+                  if os.path.isfile(os.path.join(input_dir, name)) and name.lower().endswith(batch_extensions) and not name.endswith("_RIs.txt"))
 
-    print(f"Current description: {description}")
-    print("Write \"keep\", enter > ctrl-Z > enter to keep, or write/paste corrected title, then enter > ctrl-Z > enter")
+    if not jobs:
+        print(f"No jobs found in {input_dir}")
+        return
 
-    descrInp = get_multiline_input()
+    conn = db_utils.connect(db_path)
+    cursor = conn.cursor()
+    db_utils.run_transaction(conn, setup_acknowledged)
+    table_name = get_highest_table()
+    rows = RICatalogue(table_name).rows
+    changed = unacknowledged(table_name, changed_codes(table_name))
+    conn.close()
 
-    newDescription = description if descrInp.lower() == "keep" else descrInp
+    print(f"Preparing {len(jobs)} jobs from {table_name}")
 
-    setRI(code, newTitle, newDescription, table_name)
+    if workers == 1:
+        start_batch_worker(rows, changed)
+        results = [prepare_job(job, output_dir, settings) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=start_batch_worker, initargs=(rows, changed)) as pool:
+            results = list(pool.map(prepare_job, jobs, [output_dir] * len(jobs), [settings] * len(jobs)))
+
+    failed = [result for result in results if "error" in result]
+    for result in results:
+        if "error" in result:
+            print(f"{result['job']}: Warning: couldn't be prepared - {result['error']}")
+            continue
+        print(f"{result['job']}: {len(result['codes'])} RIs -> {os.path.basename(result['output'])}")
+        if result["invalid"]:
+            print(f"  Warning: invalid codes left out - {result['invalid']}")
+        if result["duplicates"]:
+            print(f"  Duplicates: {', '.join(f'({code}:{count}x)' for code, count in result['duplicates'].items())}")
+        if result["changed"]:
+            print(f"  Please check {result['changed']} as the description or title has changed")
 
-def program():
-    global conn, cursor, warnings_allowed
-    conn = sqlite3.connect(db_path)  # Open connection
-    cursor = conn.cursor()  # Create cursor
+    print(f"Done: {len(results) - len(failed)} of {len(jobs)} jobs prepared" + (f", {len(failed)} failed" if failed else ''))
 
-    if table_name_highest_table:
-        table_name = get_highest_table()
+#####################
+# Engine
+# Everything the program does in response to an input happens in Engine.submit(), which is called straight from the window's buttons and input box
+# (or, without the window, for each line typed into the terminal). Instructions are looked up in Engine.commands by their first letter.
+# Instructions that need more input (e.g. z, e, &CODE) call ask() with what to do with the next input, rather than waiting for it.
+# The engine only talks to the window through ui (sync_checkboxes, update_display_list, etc), so it can also be driven without one:
+#       engine = Engine()
+#       engine.start()
+#       engine.submit("m069")
+#####################
 
-    app.set_output_mode_label(table_name)
+class HeadlessUI:
+    # Stands in for the window when there isn't one
+    def set_output_mode_label(self, table_name='Unknown!'):
+        pass
 
-    difset_change = False
-    difset = get_difset()
+    def set_input_mode_label(self, multiline=False):
+        pass
 
-    settings = {
-        "codeHeader": True,
-        "warnings": False,
-        "showRI": False,
-        "allWarnings": False,
-        "additional_info": True,
-        "autoDash": False
+    def sync_checkboxes(self, settings_dict):
+        pass
+
+    def update_display_list(self, items):
+        pass
+
+    def setup_disability(self):
+        pass
+
+    def enable_all_instruction_buttons(self):
+        pass
+
+class Engine:
+    toggle_messages = {
+        'P': ("showRI", lambda on: f"The full risk recommendation will {'' if on else 'NOT'} be printed to the screen"),
+        'O': ("allWarnings", lambda on: f"Debug mode {'on' if on else 'off'}."),
+        'H': ("codeHeader", lambda on: f"codeHeader is now {'on' if on else 'off'}"),
+        'I': ("additional_info", lambda on: f"Additional info is now {'on' if on else 'off'}"),
+        '-': ("autoDash", lambda on: f"Auto dash is now {'on' if on else 'off'}")
     }
 
-    while True:
+    def __init__(self, ui=None):
+        self.ui = ui or HeadlessUI()
+        self.waiting = None  # (what to do with the next input, whether it's multi-line) while an instruction needs more input
+        self.loader = None
+        self.load_error = None
+        self.is_ready = False
+        self.failed = False  # Set once a load_error has been reported, after which input is refused
+        self.queued = []  # Inputs submitted before the database had loaded
+        self.table_name = None
+        self.difset = set()
+        self.acknowledged = set()  # Codes in difset that have been acknowledged, so suggestions don't have to look them up on every key
+
+        self.settings = {
+            "codeHeader": True,
+            "warnings": False,
+            "showRI": False,
+            "allWarnings": False,
+            "additional_info": True,
+            "autoDash": False
+        }
+
+        # Whole words are checked before first letters (so help isn't h and example isn't e)
+        self.word_commands = {
+            "HELP": lambda inp: help(),
+            "EXAMPLE": lambda inp: lazy()
+        }
+        self.commands = {
+            '?': lambda inp: search(inp[1:]),
+            'C': lambda inp: print(f"So far, you have copied {orderCodes(self.lists["copied"])}"),
+            'T': lambda inp: print(f"You still have the following codes left: {orderCodes(self.lists["toCopy"])}"),
+            'S': self.manual_setup,
+            'F': self.finish,
+            'W': self.toggle_warnings,
+            '@': self.as_of,
+            'D': self.diff,
+            'E': self.edit,
+            'Z': self.auto_setup,
+            **{letter: self.toggle for letter in self.toggle_messages}
+        }
+
+    @property
+    def multiline(self):
+        return bool(self.waiting and self.waiting[1])
+
+    def start(self, background=False):
+        """
+        Loads the database, then gets ready for the first input.
+        With background=True, loading is started on another thread and this returns straight away. The caller (on the main thread) then
+        calls ready() once self.loader has finished, and anything submitted in the meantime is held until then.
+        """
+        if not background:
+            self.load()
+            self.ready()
+            return
+
+        self.loader = threading.Thread(target=self.load, daemon=True)
+        self.loader.start()
+
+    def load(self):
+        # Doesn't touch the window, so it can run on any thread
+        global conn, cursor, catalogue, replica
+
+        try:
+            if use_local_replica:
+                replica = LocalReplica(db_path, replica_dir)
+                conn = db_utils.connect(replica.take(), journal=None, check_same_thread=False)  # Open connection (to the local copy)
+            else:
+                conn = db_utils.connect(db_path, check_same_thread=False)  # Open connection
+            cursor = conn.cursor()  # Create cursor
+
+            self.table_name = get_highest_table() if table_name_highest_table else fixed_table_name
+
+            catalogue = RICatalogue(self.table_name)
+
+            write(setup_acknowledged)
+
+            self.load_changes()
+        except Exception as e:
+            self.load_error = e
+
+    def load_changes(self):
+        # Codes that changed in this version (whether they've been checked is looked up again as they're copied, in case someone else has)
+        self.difset = changed_codes(self.table_name)
+        self.acknowledged = self.difset - unacknowledged(self.table_name, self.difset)
+
+    def ready(self):
+        if self.load_error:
+            # Printed rather than raised, as raising here (in a window callback) would go unseen. Nothing can be copied without the database,
+            # so input isn't accepted from here on (is_ready stays False)
+            print(f"Warning: couldn't open {db_path} - {type(self.load_error).__name__}: {self.load_error}")
+            print("Close the program and open it again once the database is available.")
+            self.failed = True
+            self.queued = []
+            return
+
+        self.ui.set_output_mode_label(self.table_name)
+        self.is_ready = True
+
+        print(f"Ready in {(time.perf_counter() - started) * 1000:.0f}ms")
+        self.reset()
+        self.prompt()
+
+        queued, self.queued = self.queued, []
+        for text in queued:
+            self.submit(text)
+
+    def close(self):
+        if self.loader:
+            self.loader.join(timeout=10)
+        if replica:
+            replica.flush()
+        if conn:
+            conn.close()
+        if replica:
+            replica.close()
+
+    def reset(self):
+        # Start of a new job
+        global warnings_allowed
         warnings_allowed = False
-        preCode = ""
-        warned = False
+        self.preCode = ""
+        self.warned = False
 
-        additional_info = dict()
+        self.additional_info = dict()
 
-        settings["warnings"] = False
-        app.sync_checkboxes(settings)
+        self.settings["warnings"] = False
+        self.ui.sync_checkboxes(self.settings)
 
-        lists = {
+        self.lists = {
             "toCopy": set(),
             "copied": set(),
             "exception": set()
         }
 
-        if difset_change:
-            update_difset(difset)
-            difset = get_difset()
-            difset_change = False
-
-        while True:
-            app.update_display_list(orderCodes(lists["toCopy"]))
-            print("Enter code or instruction:")
-            app.sync_checkboxes(settings)
-
-
-            inp = get_input(preCode).upper().strip()
-            #inp = sys.stdin.read().upper().strip()
+    def prompt(self):
+        self.ui.update_display_list(orderCodes(self.lists["toCopy"]))
+        print("Enter code or instruction:")
+        self.ui.sync_checkboxes(self.settings)
+        self.ui.set_input_mode_label(multiline=False)
+        print(self.preCode, end="")
+
+    def suggest(self, text, limit=8):
+        """
+        Suggestions for what has been typed so far (not submitted yet): codes starting with the code being typed,
+        or, after ?, codes whose title has words starting with the words typed. Nothing is looked up in the database.
+
+        Returns:
+            list: A line for each suggestion with its code and title, and whether it's to copy, copied, or changed in this version.
+        """
+        if not self.is_ready or self.waiting:
+            return []
+
+        text = text.strip()
+        if text.startswith('?'):
+            if text[1:].isdigit():
+                return []
+            prefixes = re.findall(r"\w+", text[1:].lower())
+        else:
+            prefix = text.split('+')[-1].strip().upper()
+            if self.preCode and prefix.isdigit():
+                prefix = self.preCode + prefix
+            prefixes = [prefix] if re.fullmatch(r"[MA]\d{1,3}", prefix) else []
+
+        if not prefixes:
+            return []
+
+        lines = []
+        for code in catalogue.complete(prefixes, limit):
+            title = ' '.join((catalogue.get(code)[0] or '').split())
+            markers = [marker for marker, listed in (("to copy", code in self.lists["toCopy"]), ("copied", code in self.lists["copied"]), ("changed", code in self.difset and code not in self.acknowledged)) if listed]
+            lines.append(f"{code}  {title[:70]}{f"  [{', '.join(markers)}]" if markers else ''}")
+
+        return lines
+
+    def ask(self, handler, prompt="", multiline=False):
+        # handler gets the next input instead of it being treated as a code or instruction
+        print(prompt, end="")
+        self.waiting = (handler, multiline)
+        self.ui.set_input_mode_label(multiline)
+
+    def submit(self, text):
+        if not self.is_ready:
+            if self.failed:
+                print("Warning: the database couldn't be opened, so nothing can be copied. Close the program and open it again.")
+            else:
+                self.queued.append(text)
+            return
+
+        if self.waiting:
+            handler, multiline = self.waiting
+            self.waiting = None
+            handler(text if multiline else text.strip())
+        else:
+            self.handle(text.upper().strip())
 
-            if len(inp) == 0:
-                continue
+        if not self.waiting:
+            self.prompt()
+
+    def handle(self, inp):
+        if replica:
+            # Pick up any changes to the shared database made while waiting for input
+            newest = reload_replica(self.table_name)
+            if newest != self.table_name:
+                self.table_name = newest
+                self.load_changes()
+                self.ui.set_output_mode_label(newest)
+
+        if not inp:
+            return
+
+        if inp[0] == '&':
+            code = inp[1:]
+            print(f"Type additional info for {code}. Then click submit or ctrl-enter")
+
+            def got_info(info):
+                self.additional_info[code] = info.strip()
+
+            self.ask(got_info, multiline=True)
+            return
+
+        codesList = inp.split('+')
+
+        check = inp[0].isdigit() and self.preCode
+
+        # ?1, ?2, etc copy that result of the last search
+        picked = inp[0] == '?' and inp[1:].isdigit()
+
+        if picked:
+            if not 0 < int(inp[1:]) <= len(search_hits):
+                print("No such search result.")
+                return
+            codesList = [search_hits[int(inp[1:]) - 1]]
+            print(codesList[0])
+
+        if inp[0] == 'X':
+            if(len(self.lists['toCopy']) == 0):
+                print("All codes copied. Click the Finish button or enter 'f'.")
+                return
+            codesList = orderCodes(self.lists["toCopy"])[:1]
+            print(codesList[0])
+
+        intersection = unacknowledged(self.table_name, set(codesList) & self.difset)
+        self.acknowledged -= intersection
+        if intersection:
+            print(f"Please check {intersection} as the description or title has changed")
+            print(f"Type '({list(intersection)[0]}' to remove")
+
+        if inp[0] == '(':
+            acknowledge_change(self.table_name, inp[1:])
+            self.acknowledged.add(inp[1:])
+            return
+
+        elif inp[0] == ')':
+            if unacknowledge_change(self.table_name, inp[1:]):
+                print(f"You will be warned about {inp[1:]} again")
+            self.acknowledged.discard(inp[1:])
+            return
+
+        elif inp[0] not in nonInstructionLetters and not check and not picked:
+            handler = self.word_commands.get(inp) or self.commands.get(inp[0])
+            if handler:
+                handler(inp)
+            else:
+                print("Invalid instruction")
+            return
+
+        elif inp == "MMM":
+            self.preCode = 'M'
+            return
+
+        elif inp == "AAA":
+            self.preCode = 'A'
+            return
+
+        elif inp[0] == 'R':
+            self.preCode = ""
+            return
+
+        if not picked:
+            codesList = [self.preCode + item for item in codesList]
+
+        self.copy(codesList)
+
+    def copy(self, codesList):
+        lists = self.lists
+        settings = self.settings
+
+        entries, invalid = catalogue.lookup(codesList)
+
+        for code in invalid:
+            print(f"Invalid code: {code}")
+
+        codesList = [code for code, _, _ in entries]
+
+        for code in codesList:
+            if settings['warnings']:
+                try:
+                    lists["toCopy"].remove(code)
+                except KeyError:
+                    if code not in lists["copied"]:
+                        print("------------------------")
+                        print(f"Warning: {code} not found in the list.")
+                        print("------------------------")
 
-            if inp[0] == '&':
-                code = inp[1:]
-                print(f"Type additional info for {code}. Then click submit or ctrl-enter")
-                info = get_multiline_input()
+                if code in lists["copied"]:
+                    print("------------------------")
+                    print(f"Warning: {code} already copied: {orderCodes(lists["copied"])}")
+                    print("------------------------")
 
-                additional_info[code] = info.strip()
+            elif not self.warned:
+                print("------------------------")
+                print("You have not entered full list of codes. Warnings are now disabled. To reset, click the Finish button or enter 'f'")
+                print("------------------------")
+                self.warned = True
 
-                continue
+            lists["copied"].add(code)
 
+        if len(entries) == 0:
+            print("No valid codes received.")
+            return
 
-            if not inp:
-                continue
+        texts, final = catalogue.render(codesList, settings, self.additional_info)
 
-            codesList = inp.split('+')
+        for (code, title, _), text in zip(entries, texts):
+            if code in self.additional_info and settings["additional_info"]:
+                print(self.additional_info[code])
 
-            check = inp[0].isdigit() and preCode
+            if settings["showRI"]:
+                print(text)
+            else:
+                print(title)
 
-            if inp[0] == 'X':
-                if(len(lists['toCopy']) == 0):
-                    print("All codes copied. Click the Finish button or enter 'f'.")
-                    continue
-                codesList = orderCodes(lists["toCopy"])[:1]
-                print(codesList[0])
+        import pyperclip  # Imported on the first copy rather than at startup
+        pyperclip.copy(final)
 
-            intersection = set(codesList) & difset
-            if intersection:
-                print(f"Please check {intersection} as the description or title has changed")
-                print(f"Type '({list(intersection)[0]}' to remove")
+    def finish(self, inp):
+        if self.lists["toCopy"]:
+            print("------------------------")
+            print(f"Warning: codes not copied - {orderCodes(self.lists["toCopy"])}")
+            print("------------------------")
 
-            if inp[0] == '(':
-                difset.discard(inp[1:])
-                difset_change = True
-                continue
-            
-            elif inp[0] not in nonInstructionLetters and not check:
-                if parseInstruction(inp, lists, settings, table_name):
-                    continue
-                else:
-                    break
+        elif self.settings["warnings"]:
+            print("Every code was copied!")
+        else:
+            print("Warnings were disabled - let's hope everything was copied!")
 
-            elif inp == "MMM":
-                preCode = 'M'
-                continue
+        print("...everything reset...")
+        self.reset()
 
-            elif inp == "AAA":
-                preCode = 'A'
-                continue
+    def toggle(self, inp):
+        key, message = self.toggle_messages[inp[0]]
+        self.settings[key] = not self.settings[key]
+        print(message(self.settings[key]))
+        self.ui.sync_checkboxes(self.settings)
 
-            elif inp[0] == 'R':
-                preCode = ""
-                continue
+    def toggle_warnings(self, inp):
+        if warnings_allowed:
+            self.settings["warnings"] = not self.settings["warnings"]
+        else:
+            self.settings["warnings"] = False
+            print("You cannot turn warnings on without codes to copy.")
+        print(f"Warnings now {'on' if self.settings["warnings"] else 'off'}.")
+        self.ui.sync_checkboxes(self.settings)
+
+    def as_of(self, inp):
+        # @M069 2025-05-01 shows M069 as it was on that date
+        parts = inp[1:].split()
+        if len(parts) != 2 or not re.fullmatch(r"\d{4}-\d{2}-\d{2}", parts[1]):
+            print("Type @ then the code and date, e.g. @M069 2025-05-01")
+            return
+        title, description = getRI_as_of(*parts)
+        if not title and not description:
+            print(f"{parts[0]} didn't exist on {parts[1]}")
+        else:
+            print(formatRI(parts[0], title, description or '', True))
+
+    def diff(self, inp):
+        # D on its own compares with the previous version, or D RI20250306 RI20250901 compares any two
+        versions = inp.split()[1:]
+        if not versions:
+            versions = [get_previous_table(self.table_name), self.table_name]
+        if len(versions) != 2 or not set(versions) <= set(get_versions()):
+            print(f"Can't compare those. The versions are: {', '.join(get_versions())}")
+            return
+        print_diff(*versions)
+
+    def auto_setup(self, inp):
+        print("Paste text and then press the Submit button (or press ctrl-enter)")
+        self.ask(lambda text: autoSetUp(text, self.lists, self.settings, self.additional_info), multiline=True)
+
+    def manual_setup(self, inp):
+        print("Please enter the full list of codes to copy for then press Manual Setup again once finished (or press 's')")
+        self.ui.setup_disability()
+        self.entered = 0
+        self.setup_preCode = ""
+        self.ask(self.manual_setup_code)
+
+    def manual_setup_code(self, inp):
+        inp = inp.upper()
+        if inp == 'DONE' or inp == 'D' or inp == 'S':
+            global warnings_allowed
+            self.ui.enable_all_instruction_buttons()
+            self.settings["warnings"] = True
+            warnings_allowed = True
+            print(f"{len(self.lists["toCopy"])} unique codes to copy: {orderCodes(self.lists["toCopy"])} ({self.entered} codes entered)")
+            return
 
+        if inp == "MMM":
+            self.setup_preCode = 'M'
+        elif inp == "AAA":
+            self.setup_preCode = 'A'
+        elif inp[:1] == 'R':
+            self.setup_preCode = ""
+        elif not re.fullmatch(r'\b(?:M|A)\d{3}\b', self.setup_preCode + inp):
+            print("Invalid code.")
+        else:
+            codeInp = self.setup_preCode + inp
+            if codeInp in self.lists["toCopy"]:
+                hline()
+                print(f"{codeInp} already entered")
+                hline()
+            else:
+                self.lists["toCopy"].add(codeInp)
 
+            self.entered += 1
 
-            codesList = [preCode + item for item in codesList]
+        self.ask(self.manual_setup_code, self.setup_preCode)
 
-            titles = []
-            descriptions = []
-            for code in codesList:
-                titleUnchecked, descriptionUnchecked = getRI(code, table_name)
+    def edit(self, inp):
+        self.ask(self.edit_code, "Enter code to edit/create or 'del' to delete a code")
 
-                if not titleUnchecked and not descriptionUnchecked:
-                    print(f"Invalid code: {code}")
-                    codesList.remove(code)
-                    continue
-                else:
-                    titles.append(titleUnchecked)
-                    descriptions.append(descriptionUnchecked)
+    def edit_code(self, code):
+        code = code.upper()
+        if code == 'DEL':
+            self.ask(self.delete_code, "Enter a code to delete:")
+        else:
+            self.edit_entry(code)
 
-                if settings['warnings']:
-                    try:
-                        lists["toCopy"].remove(code)
-                    except KeyError:
-                        if code not in lists["copied"]:
-                            print("------------------------")
-                            print(f"Warning: {code} not found in the list.")
-                            print("------------------------")
+    def delete_code(self, code):
+        code = code.upper()
+        if deleteRI(code, self.table_name):
+            self.load_changes()  # The edit can change which codes count as changed in this version
+            self.edit_entry(code)
 
-                    if code in lists["copied"]:
-                        print("------------------------")
-                        print(f"Warning: {code} already copied: {orderCodes(lists["copied"])}")
-                        print("------------------------")
+    def edit_entry(self, code):
+        title, description = getRI(code, self.table_name)
 
-                elif not warned:
-                    print("------------------------")
-                    print("You have not entered full list of codes. Warnings are now disabled. To reset, click the Finish button or enter 'f'")
-                    print("------------------------")
-                    warned = True
+        if not title or not description:
+            def confirm(answer):
+                if answer.lower() == 'y':
+                    self.edit_title(code, title, description)
 
-                lists["copied"].add(code)
+            self.ask(confirm, "Code not found. Would you like to make a new entry? 'y' then enter for yes, anything else for no.")
+        else:
+            self.edit_title(code, title, description)
 
-            if len(titles) == 0 or len(descriptions) == 0:
-                print("No valid codes received.")
-                continue
+    def edit_title(self, code, title, description):
+        print(f"Editing database for {code}:")
+        print(f"Current title: {title}")
+        print("Write \"keep\", then enter > ctrl-Z > enter to keep, or write/paste corrected title, then enter > ctrl-Z > enter")
 
-            texts = []
-            for title, description, code in zip(titles, descriptions, codesList):
-                additional = ''
+        def got_title(titleInp):
+            titleInp = titleInp.strip()
+            newTitle = title if titleInp.lower() == "keep" else titleInp
 
-                if code in additional_info and settings["additional_info"]:
-                    additional = additional_info[code]
-                    print(additional)
+            print(f"Current description: {description}")
+            print("Write \"keep\", enter > ctrl-Z > enter to keep, or write/paste corrected title, then enter > ctrl-Z > enter")
 
-                if settings["codeHeader"] and len(titles) == 1:
-                    text = f"{code}{f" (\"{additional}\")" if additional else ''}\n-\n{title}{f"\n-\n{description}" if description else ''}"
-                elif settings["autoDash"] and title == titles[0]:
-                    text = f"{f"(\"{additional}\")\n-\n" if additional else '\n-\n'}{title}{f"\n-\n{description}" if description else ''}"
-                else:
-                    text = f"{f"(\"{additional}\")\n-\n" if additional else ''}{title}{f"\n-\n{description}" if description else ''}"
-                    
+            def got_description(descrInp):
+                descrInp = descrInp.strip()
+                newDescription = description if descrInp.lower() == "keep" else descrInp
 
-                if settings["showRI"]:
-                    print(text)
-                else:
-                    print(title)
+                setRI(code, newTitle, newDescription, self.table_name)
+                self.load_changes()
 
-                texts.append(text)
+            self.ask(got_description, multiline=True)
 
-            final = '\n+\n'.join(texts)
+        self.ask(got_title, multiline=True)
 
-            pyperclip.copy(final)
+def program(engine):
+    # Runs the engine from the terminal (without the window)
+    engine.start()
+    if not engine.is_ready:
+        sys.exit(1)
 
-        if lists["toCopy"]:
-            print("------------------------")
-            print(f"Warning: codes not copied - {orderCodes(lists["toCopy"])}")
-            print("------------------------")
-            
-        elif settings["warnings"]:
-            print("Every code was copied!")
+    while True:
+        if engine.multiline:
+            text = sys.stdin.read()
         else:
-            print("Warnings were disabled - let's hope everything was copied!")
-
-        set_json = json.dumps(list(difset))
+            text = sys.stdin.readline()
+            if not text:
+                break
 
-        cursor.execute("""
-            INSERT OR REPLACE INTO differences (id, difset)
-            VALUES (1, ?)
-        """, (set_json,))
+        engine.submit(text)
 
-        print("...everything reset...")
-
-def tryfinally():
-    try:
-        program()
+if __name__ == "__main__":
+    # Batch mode's worker processes start by running this file again. In the bundled .exe that would open another window, unless this comes first
+    import multiprocessing
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description="Copy risk improvements to the clipboard")
+    parser.add_argument("--migrate-history", action="store_true", help="Move the RI tables into the version store (each distinct text saved once) and exit")
+    parser.add_argument("--import", dest="import_path", metavar="MASTER_LIST", help="Publish an xlsx, csv or json list of RIs (code, title and description) as a new version and exit")
+    parser.add_argument("--version", help="Name of the imported version (defaults to RI followed by today's date)")
+    parser.add_argument("--allow-removals", action="store_true", help="Import even if the list is missing a large share of the latest version's codes")
+    parser.add_argument("--batch", metavar="FOLDER", help="Save the RIs for every job (flagged items text file) in a folder, without the window, and exit")
+    parser.add_argument("--output", metavar="FOLDER", help="Where to save the batch RIs (defaults to the batch folder)")
+    parser.add_argument("--no-header", action="store_true", help="Batch RIs without the code above each one")
+    parser.add_argument("--no-comments", action="store_true", help="Batch RIs without the consultant's comments as additional info")
+    parser.add_argument("--dash", action="store_true", help="Batch RIs with a dash before each one (as with the Dash setting)")
+    parser.add_argument("--workers", type=int, help="Number of processes for batch mode (defaults to one per CPU)")
+    args = parser.parse_args()
+
+    if args.migrate_history:
+        conn = db_utils.connect(db_path)
+        cursor = conn.cursor()
+        migrate_to_version_store()
+        conn.close()
 
-    finally:
+    elif args.import_path:
+        conn = db_utils.connect(db_path)
+        cursor = conn.cursor()
+        import_master_list(args.import_path, args.version, args.allow_removals)
         conn.close()
 
-if __name__ == "__main__":
+    elif args.batch:
+        batch(args.batch, args.output, {"codeHeader": not args.no_header, "autoDash": args.dash, "additional_info": not args.no_comments}, args.workers)
 
-    if windowed:
-        app = TerminalApp(tryfinally)
-        app.mainloop()
-    
     else:
-        sys.stdin = sys.__stdin__
-        sys.stdout = sys.__stdout__
-        tryfinally()
\ No newline at end of file
+        engine = Engine()
+        try:
+            if windowed:
+                from autoCopy3_window import TerminalApp  # Only needed for the window, so tkinter isn't loaded otherwise
+                app = TerminalApp(engine, f"AutoCopy{program_ver}", os.path.join(replica_dir, "Logs"))
+                app.mainloop()
+            else:
+                program(engine)
+
+        finally:
+            engine.close()
\ No newline at end of file
@@ -0,0 +1,327 @@
+#####################
+# The window for autoCopy3.py (keep this file next to it). The program itself is in autoCopy3.py, this is just the boxes and buttons.
+# It's only imported once the window is about to open, so --batch and --import don't have to load tkinter.
+#####################
+
+import os
+import sys
+import time
+import threading
+import tkinter as tk
+from tkinter import ttk
+from tkinter.scrolledtext import ScrolledText
+
+# The output box only keeps the last output_max_lines lines, so it stays quick over a full day of jobs.
+# Once it's output_trim_lines over, the oldest lines are removed in one go (and saved to a session log in AutoCopy\Logs if output_log is on, so they can still be searched).
+output_max_lines = 5000
+output_trim_lines = 500
+output_log = True
+
+class StdoutRedirector:
+    # Printed text is collected here and put into the output box at most once per frame, rather than one Tk callback per print
+    frame_ms = 16
+    max_chars = 200000  # Most text put in per frame (anything more waits for the next frame, so the window keeps responding)
+
+    def __init__(self, text_widget, log_dir):
+        self.text_widget = text_widget
+        self.log_dir = log_dir
+        self.text_widget.tag_configure("input", foreground="grey")
+        self.text_widget.tag_configure("warning", foreground="red")
+
+        self.lock = threading.Lock()
+        self.pending = []
+        self.scheduled = False
+
+        self.log_path = None
+
+    def write(self, string):
+        if not string:
+            return
+
+        with self.lock:
+            self.pending.append(string)
+            if self.scheduled:
+                return
+            self.scheduled = True
+
+        self.text_widget.after(self.frame_ms, self._write)
+
+    def tag(self, string):
+        if string.startswith(">>> "):
+            return "input"
+        elif "Warning:" in string:
+            return "warning"
+        return ""
+
+    def _write(self):
+        with self.lock:
+            taken = 0
+            size = 0
+            while taken < len(self.pending) and (taken == 0 or size + len(self.pending[taken]) <= self.max_chars):
+                size += len(self.pending[taken])
+                taken += 1
+            strings = self.pending[:taken]
+            del self.pending[:taken]
+
+            # Decided here, under the lock, so a write() from another thread can't also schedule a flush
+            more = self.scheduled = bool(self.pending)
+
+        if not strings:
+            return
+
+        # Join neighbouring strings with the same tag, then put them all in with one insert
+        runs = []
+        for string in strings:
+            tag = self.tag(string)
+            if runs and runs[-1][1] == tag:
+                runs[-1][0].append(string)
+            else:
+                runs.append(([string], tag))
+
+        args = []
+        for run, tag in runs:
+            args += [''.join(run), tag]
+
+        self.text_widget.config(state='normal')
+        self.text_widget.insert(tk.END, *args)
+
+        lines = int(self.text_widget.index('end-1c').split('.')[0])
+        if lines > output_max_lines + output_trim_lines:
+            self.trim(lines - output_max_lines)
+
+        self.text_widget.see(tk.END)
+        self.text_widget.config(state='disabled')
+
+        if more:
+            self.text_widget.after(self.frame_ms, self._write)
+
+    def trim(self, count):
+        # Removes the oldest count lines from the output box
+        end = f"{count + 1}.0"
+        if output_log:
+            self.save_log(self.text_widget.get("1.0", end))
+        self.text_widget.delete("1.0", end)
+
+    def save_log(self, text):
+        global output_log
+        try:
+            if not self.log_path:
+                os.makedirs(self.log_dir, exist_ok=True)
+                self.log_path = os.path.join(self.log_dir, f"session_{time.strftime('%Y%m%d_%H%M%S')}.txt")
+
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(text)
+        except OSError:
+            output_log = False  # Not worth interrupting anyone over, just keep trimming without saving
+
+    def flush(self):
+        pass
+
+class TerminalApp(tk.Tk):
+    suggestion_delay = 80
+    def __init__(self, engine, title, log_dir):
+        super().__init__()
+        self.title(title)
+
+        container = ttk.Frame(self, padding=10)
+        container.pack(expand=True, fill='both')
+
+        self.controls_visible = True
+        self.manual_override_disabled = False
+
+        # Output label and box
+        self.output_label = ttk.Label(container, text="Output:")
+        self.output_label.pack(anchor='w')
+        self.output = ScrolledText(container, height=8, wrap='word', bg='white', fg='black', font = ("Consolas", 10))
+        self.output.pack(fill='both', expand=True, pady=(0, 10))
+        self.output.config(state='disabled')
+
+        # Input label and box
+        self.input_label = ttk.Label(container, text="Input:")
+        self.input_label.pack(anchor='w')
+        self.input_text = ScrolledText(container, height=8, wrap='word', bg='white', fg='black', font = ("Consolas", 10))
+        self.input_text.pack(fill='x')
+        self.input_text.bind("<Return>", self.handle_return)
+        self.input_text.bind("<Control-Return>", self.ctrl_enter_submit)
+
+        self.input_text.bind("<Button-3>", self.paste_from_clipboard)
+        self.input_text.bind("<KeyRelease>", self.schedule_suggestions)
+
+        # Suggestions for the code (or ?search) being typed
+        self.suggestion_job = None
+        self.suggestion_label = ttk.Label(container, text="", anchor='w', justify='left', foreground='grey', font=("Consolas", 9))
+        self.suggestion_label.pack(fill='x')
+
+        ttk.Label(container, text="Codes to Copy:").pack(anchor='w', pady=(10, 0))
+
+        # Display area for list (read-only text box)
+        self.display_list_label = ttk.Label(container, text="", anchor='w', background='white')
+        self.display_list_label.pack(fill='x', pady=(0, 10))
+
+        button_row = ttk.Frame(container)
+        button_row.pack(pady=(10, 0))
+
+        ttk.Button(button_row, text="Toggle Controls", command=self.toggle_controls).pack(side='left', padx=(0, 5))
+        ttk.Button(button_row, text="Help", command=lambda: self.on_instruction_press("help")).pack(side='left')
+
+        # === Controls Section (Settings + Instructions + Submit) ===
+        self.controls_frame = ttk.Frame(container)
+        self.controls_frame.pack(fill='x', pady=10)
+
+        # Settings (checkboxes)
+        settings_frame = ttk.LabelFrame(self.controls_frame, text="Settings")
+        settings_frame.pack(side='left', expand=True, fill='both', padx=(0, 10))
+
+        setting_names = [("Header", 'h'), ("Dash", '-'), ("Additional Info", 'i'), ("Show Full RI", 'p'), ("Warnings", 'w'), ("Debug", 'o')]
+        self.settings = []
+        for i in range(6):
+            name, char = setting_names[i]
+            var = tk.BooleanVar()
+            cb = ttk.Checkbutton(settings_frame, text=name, variable=var)
+            cb.config(command=lambda c=char: self.on_setting_toggle(c))
+            cb.pack(anchor='w', padx=5, pady=2)
+            self.settings.append((var, cb))
+
+        # Instructions (buttons)
+        instructions_frame = ttk.LabelFrame(self.controls_frame, text="Instructions")
+        instructions_frame.pack(side='right', expand=True, fill='both')        
+
+        instruction_names = [("Next", 'x'), ("Auto Setup (paste all RIs)", 'z'), ("Manual Setup (enter RIs one-by-one)", 's'), ("Show copied codes", 'c'), ("Finish", 'f')]
+
+        self.instruction_buttons = []
+        for name, char in instruction_names:
+            b = ttk.Button(instructions_frame, text=name)
+            b.config(command=lambda c=char: self.on_instruction_press(c))
+            b.pack(fill='x', padx=5, pady=2)
+            self.instruction_buttons.append(b)
+
+        # Separator + Submit button frame
+        self.submit_section = ttk.Frame(container)
+        self.submit_section.pack(fill='x')
+
+        ttk.Separator(self.submit_section, orient='horizontal').pack(fill='x', pady=(10, 5))
+        ttk.Button(self.submit_section, text="Submit", command=self.on_submit).pack(fill='x')
+
+        # Printed output goes to the output box, and everything typed or clicked goes straight to the engine (on this thread, so it can update the widgets)
+        self.stdout = StdoutRedirector(self.output, log_dir)
+        sys.stdout = self.stdout
+
+        self.engine = engine
+        self.engine.ui = self
+        self.engine.start(background=True)
+        self.after(10, self.wait_for_engine)
+
+    def wait_for_engine(self):
+        # The window is up while the database loads, this checks every 10ms whether it's done
+        if self.engine.loader.is_alive():
+            self.after(10, self.wait_for_engine)
+        else:
+            self.engine.ready()
+            if not self.engine.is_ready:
+                # The database couldn't be loaded (the reason is in the output box), so input is switched off
+                self.input_text.config(state='disabled')
+                for b in self.instruction_buttons:
+                    b.config(state='disabled')
+                for _, cb in self.settings:
+                    cb.config(state='disabled')
+    
+    def paste_from_clipboard(self, event=None):
+        try:
+            text = self.clipboard_get()
+            self.input_text.insert(tk.INSERT, text)
+        except tk.TclError:
+            pass  # Clipboard empty or not text
+
+    def on_submit(self):
+        text = self.input_text.get("1.0", tk.END).strip()
+        if text:
+            self.input_text.delete("1.0", tk.END)
+            sys.stdout.write(f">>> {text}\n")
+            self.engine.submit(text)
+            self.suggestion_label.config(text="")
+
+    def schedule_suggestions(self, event=None):
+        # Waits until typing pauses for suggestion_delay ms before updating the suggestions, so typing never lags
+        if self.suggestion_job:
+            self.after_cancel(self.suggestion_job)
+        self.suggestion_job = self.after(self.suggestion_delay, self.show_suggestions)
+
+    def show_suggestions(self):
+        self.suggestion_job = None
+        lines = self.engine.suggest(self.input_text.get("1.0", "end-1c"))
+        self.suggestion_label.config(text="\n".join(lines))
+
+    def handle_return(self, event):
+        if not self.engine.multiline:
+            self.on_submit()
+            return "break"  # Prevent newline insertion
+        # Else: allow newline
+
+    def ctrl_enter_submit(self, event):
+        self.on_submit()
+        return "break"
+
+    def toggle_controls(self):
+        if self.controls_visible:
+            self.controls_frame.pack_forget()
+            self.submit_section.pack_forget()
+        else:
+            self.controls_frame.pack(fill='x', pady=10)
+            self.submit_section.pack(fill='x')
+        self.controls_visible = not self.controls_visible
+
+    def on_instruction_press(self, char):
+        sys.stdout.write(f">>> {char}\n")
+        self.engine.submit(char)
+
+    def on_setting_toggle(self, char):
+        sys.stdout.write(f">>> {char}\n")
+        self.engine.submit(char)
+    
+    def setup_disability(self):
+        manual_setup_index = 2  # Index of "Manual Setup (enter RIs one-by-one)"
+        self.manual_override_disabled = True
+        for i, button in enumerate(self.instruction_buttons):
+            state = 'normal' if i == manual_setup_index else 'disabled'
+            button.config(state=state)
+        for _, cb in self.settings:
+            cb.config(state='disabled')
+
+    def enable_all_instruction_buttons(self):
+        self.manual_override_disabled = False
+        for b in self.instruction_buttons:
+            b.config(state='enabled')
+        for _, cb in self.settings:
+            cb.config(state='enabled')
+
+    def set_input_mode_label(self, multiline=False):
+        if multiline:
+            self.input_label.config(text="Input (Multi-line - ctrl-Enter or press Submit button to submit):")
+            for b in self.instruction_buttons:
+                b.config(state='disabled')
+            for _, cb in self.settings:
+                cb.config(state='disabled')
+        else:
+            self.input_label.config(text="Input:")
+            if not self.manual_override_disabled:
+                for b in self.instruction_buttons:
+                    b.config(state='normal')
+                for _, cb in self.settings:
+                    cb.config(state='normal')
+
+    def set_output_mode_label(self, table_name='Unknown!'):
+        self.output_label.config(text=f"Output (from {table_name}):")
+
+    def sync_checkboxes(self, settings_dict):
+        # Keys must match the order of self.settings
+        settings_keys = ["codeHeader", "autoDash", "additional_info",
+                        "showRI", "warnings", "allWarnings"]
+        
+        for (var, _), key in zip(self.settings, settings_keys):
+            new_value = settings_dict.get(key, False)
+            if var.get() != new_value:
+                var.set(new_value)
+
+    def update_display_list(self, items):
+        display_text = ", ".join(str(item) for item in items)
+        self.display_list_label.config(text=display_text)
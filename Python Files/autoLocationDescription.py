@@ -5,25 +5,57 @@
 #   - Distance to capital city CBD (straight line distance)
 #   - What LGA the suburb is in
 # Note that suburbs within 50km of the capital city CBD are described as a "suburb of {capital city}" while suburbs/towns/cities outside of the 50km radius are described as "a town in {state}"
-# Also note that for suburbs in non-capital cities (e.g. Townsville, Newcastle, etc), this will not be reflected in the description. 
-# In this case, manually change the description and then create a custom description (info below). 
+# Suburbs/towns closer to a major regional centre (e.g. Townsville, Newcastle, etc) than to the capital are also described relative to the nearest centre (see regional_centres below).
+# If that still isn't right, manually change the description and then create a custom description (info below). 
 ######################
 # There is an associated database special_location_descriptions.db which saves custom location descriptions for suburbs
 # To make a custom location description, type a # before the suburb name (e.g. #Rozelle)
 # Then, copy-paste the location description and then {enter} {ctrl-Z} {enter}
 # This custom location description will be used next time you input this suburb.
 ######################
+# GPS coordinates can also be entered instead of a suburb name (e.g. -33.8646, 151.1742). The nearest locality in suburbs.csv is then described.
+# A postcode can be entered too, either on its own (e.g. 2039) or after the suburb name (e.g. Springfield 4300) to skip picking between suburbs with the same name.
+######################
 # Make sure not to move the databases folder or this program around, as it relies on being able to find the ABS csv's and the database.
+# The database is opened through db_utils.py, which needs to stay in the same folder as this program.
+# The ABS csv's are compiled into gazetteer_index.pkl (next to the csv's) the first time this runs, and again whenever one of them changes.
+# To force a rebuild, run this program with --build-index
+# Every locality's description is also generated ahead of time into Databases/location_descriptions.pkl (regenerated when the csv's or special descriptions change).
+# Run this program with --export-descriptions all.csv to save them all to a csv.
+######################
+# Batch mode: run this program with --batch jobs.csv (a csv with suburb and state columns, or a text file with one "suburb, state" per line)
+# Coordinates can be given instead of a suburb (lat and lng columns, or "-33.86, 151.17" lines), in which case the nearest locality is described.
+# Every suburb is described in one go and saved to jobs_descriptions.csv. Suburbs that would normally need you to pick a match are flagged in the status column instead.
+######################
+# Service mode: run this program with --serve to keep everything loaded in one long-running process (several people can use it at once).
+# Running this program normally then just sends lookups to the service if it's running, so they come back straight away. Use --local to skip it.
+# Type ?name to list suburbs starting with (or close to) name.
 ######################
 
-import pandas as pd
 import pyperclip
 import shutil
 import os
 import re
 import math
-import sqlite3
+import db_utils
 import sys
+import pickle
+import tempfile
+import hashlib
+import time
+import argparse
+import csv
+import json
+import threading
+import urllib.request
+import urllib.parse
+import urllib.error
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from array import array
+import bisect
+import heapq
+from collections import Counter
+import numpy as np
 from pathlib import Path
 
 # db_path = r"C:\Users\asset\OneDrive - Asset Inspect\AI Shared Folder\Administration\Programs\Databases\special_location_descriptions.db"
@@ -39,6 +71,21 @@ file1 = abs_stats_dir / "SAL_2021_AUST.csv"
 file2 = abs_stats_dir / "2021Census_G01_AUST_SAL.csv"
 file3 = abs_stats_dir / "suburbs.csv"
 
+# Compiled copy of the three csv's above (only the columns this program uses). Rebuilt automatically whenever one of the csv's changes.
+index_path = abs_stats_dir / "gazetteer_index.pkl"
+index_version = 7
+
+# Extra census statistics to add to the end of descriptions: (census csv in ABS Stats, column, sentence). Uncomment (or add) the ones you want.
+# The sentence can use {suburb} and {value}. Only the columns listed here (and Tot_P_P) are read from the census csv's.
+census_extras = [
+    # ("2021Census_G01_AUST_SAL.csv", "Count_Psns_occ_priv_dwgs_P", "{value:,} of its residents live in occupied private dwellings."),
+    # ("2021Census_G02_AUST_SAL.csv", "Median_age_persons", "The median age in {suburb} is {value}."),
+]
+
+# Every locality's description, generated ahead of time. Rebuilt when the csv's, the special descriptions or the description settings change.
+descriptions_path = base_dir / "Databases" / "location_descriptions.pkl"
+descriptions_version = 2  # Bump when the wording of standard_description changes, so saved descriptions are regenerated
+
 table_name = "descriptions"
 
 statesLs = ['NSW', 'VIC', 'QLD', 'SA', 'WA', 'TAS', 'NT', 'ACT']
@@ -76,6 +123,46 @@ city_lng_lat = {
     "Canberra": (-35.2802, 149.1310)
 }
 
+# Regional centres. Suburbs/towns further than 60km from the capital are also described relative to the nearest of these (if it is closer than the capital)
+regional_centres_mode = True
+
+# (name used in the description, locality in suburbs.csv, state)
+# Set this to None to instead use every locality in suburbs.csv with a population of at least regional_centre_min_population (that isn't within 60km of a capital)
+regional_centres = [
+    ("Newcastle", "Newcastle", "NSW"), ("Wollongong", "Wollongong", "NSW"), ("Albury", "Albury", "NSW"), ("Wagga Wagga", "Wagga Wagga", "NSW"),
+    ("Tamworth", "Tamworth", "NSW"), ("Orange", "Orange", "NSW"), ("Dubbo", "Dubbo", "NSW"), ("Bathurst", "Bathurst", "NSW"),
+    ("Port Macquarie", "Port Macquarie", "NSW"), ("Coffs Harbour", "Coffs Harbour", "NSW"), ("Lismore", "Lismore", "NSW"), ("Armidale", "Armidale", "NSW"),
+    ("Broken Hill", "Broken Hill", "NSW"), ("Goulburn", "Goulburn", "NSW"), ("Nowra", "Nowra", "NSW"),
+    ("Geelong", "Geelong", "VIC"), ("Ballarat", "Ballarat Central", "VIC"), ("Bendigo", "Bendigo", "VIC"), ("Shepparton", "Shepparton", "VIC"),
+    ("Mildura", "Mildura", "VIC"), ("Warrnambool", "Warrnambool", "VIC"), ("Traralgon", "Traralgon", "VIC"), ("Wodonga", "Wodonga", "VIC"), ("Horsham", "Horsham", "VIC"),
+    ("Townsville", "Townsville City", "QLD"), ("Cairns", "Cairns City", "QLD"), ("Toowoomba", "Toowoomba City", "QLD"), ("Mackay", "Mackay", "QLD"),
+    ("Rockhampton", "Rockhampton City", "QLD"), ("Bundaberg", "Bundaberg Central", "QLD"), ("Hervey Bay", "Pialba", "QLD"), ("Gladstone", "Gladstone Central", "QLD"),
+    ("Mount Isa", "Mount Isa City", "QLD"), ("Sunshine Coast", "Maroochydore", "QLD"), ("Gold Coast", "Southport", "QLD"), ("Emerald", "Emerald", "QLD"),
+    ("Mount Gambier", "Mount Gambier", "SA"), ("Whyalla", "Whyalla", "SA"), ("Port Augusta", "Port Augusta", "SA"), ("Port Lincoln", "Port Lincoln", "SA"), ("Murray Bridge", "Murray Bridge", "SA"),
+    ("Bunbury", "Bunbury", "WA"), ("Geraldton", "Geraldton", "WA"), ("Kalgoorlie", "Kalgoorlie", "WA"), ("Albany", "Albany", "WA"), ("Broome", "Broome", "WA"),
+    ("Port Hedland", "Port Hedland", "WA"), ("Karratha", "Karratha", "WA"), ("Busselton", "Busselton", "WA"), ("Mandurah", "Mandurah", "WA"),
+    ("Launceston", "Launceston", "TAS"), ("Devonport", "Devonport", "TAS"), ("Burnie", "Burnie", "TAS"),
+    ("Alice Springs", "Alice Springs", "NT"), ("Katherine", "Katherine", "NT")
+]
+regional_centre_min_population = 20000
+
+# Within regional_suburb_radius km of a centre is "a suburb of {centre}". Further than regional_town_radius km away, the centre isn't mentioned.
+regional_suburb_radius = 20
+regional_town_radius = 100
+
+# Coordinates outside australia_bounds (south, north, west, east), or further than max_locality_distance km from every locality, are treated as mistyped
+australia_bounds = (-44.5, -9.0, 112.0, 160.0)
+max_locality_distance = 50
+
+# Location description service (run this program with --serve). Set service_host to "0.0.0.0" to share it with the rest of the office,
+# and service_url to that computer's address (e.g. "http://office-pc:8765") on everyone else's.
+service_host = "127.0.0.1"
+service_port = 8765
+# The address rather than "localhost", which Windows tries as ::1 first (a couple of seconds wasted every time the service isn't running)
+service_url = f"http://{'127.0.0.1' if service_host == '0.0.0.0' else service_host}:{service_port}"
+service_timeout = 10  # Seconds to wait for a lookup
+probe_timeout = 0.2  # Seconds to wait when checking whether the service is running at startup
+
 def haversine_distance_and_direction(lat1, lon1, lat2, lon2):
     """
     Calculates the distance and approximate direction between two points on Earth's surface.
@@ -129,180 +216,1310 @@ def haversine_distance_and_direction(lat1, lon1, lat2, lon2):
 
     return distance, direction
 
-def get_population(suburb_name, file1, file2, statesLs):
-    # Read the two CSV files
-    df1 = pd.read_csv(file1)
-    df2 = pd.read_csv(file2)
+directions = ["North", "North-East", "East", "South-East", "South", "South-West", "West", "North-West"]
+
+def haversine_distance_and_direction_np(lat1, lon1, lat2, lon2):
+    """
+    Vectorised version of haversine_distance_and_direction, taking arrays of coordinates (in degrees) and working on them in one pass.
+
+    Returns:
+        tuple: An array of distances in kilometers and an array of directions.
+    """
+
+    R = 6371  # Earth's radius in kilometers
+
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
+    distance = R * 2 * np.arcsin(np.sqrt(a))
+
+    bearing = np.degrees(np.arctan2(np.sin(dlon) * np.cos(lat2),
+                                    np.cos(lat1)*np.sin(lat2) - np.sin(lat1)*np.cos(lat2)*np.cos(dlon)))
+    bearing = (bearing + 360) % 360
+
+    # Same 45 degree sectors as the scalar version, starting with North at 337.5
+    sector = (((bearing + 22.5) % 360) // 45).astype(int)
+
+    return distance, np.array(directions)[sector]
+
+def source_signature(files):
+    # mtime and size of each source csv, used to tell whether the gazetteer index is stale
+    signature = {}
+    for file in files:
+        stat = os.stat(file)
+        signature[Path(file).name] = (stat.st_mtime_ns, stat.st_size)
+    return signature
+
+def load_census(file, columns):
+    """
+    Reads only the given columns of an ABS census csv. The file is streamed a line at a time and each line is only split as far as the last column needed,
+    so memory stays small and it takes a fraction of the time of reading the whole table with pandas.
+
+    Returns:
+        tuple: {SAL code (without the "SAL"): row number}, and {column: array of values (integers where possible)}
+    """
+    with open(file, encoding='utf-8-sig') as f:
+        header = f.readline().rstrip('\r\n').split(',')
+        code_index = header.index('SAL_CODE_2021')
+        indexes = [header.index(column) for column in columns]
+        last = max(indexes + [code_index])
+
+        rows = {}
+        values = [[] for _ in columns]
+        for line in f:
+            parts = line.rstrip('\r\n').split(',', last + 1)
+            if len(parts) <= last:
+                continue
+            rows[parts[code_index].removeprefix('SAL')] = len(rows)
+            for column_values, i in zip(values, indexes):
+                column_values.append(parts[i])
+
+    data = {}
+    for column, column_values in zip(columns, values):
+        try:
+            data[column] = array('q', map(int, column_values))
+        except ValueError:
+            data[column] = array('d', (float(value) if value else math.nan for value in column_values))
+
+    return rows, data
+
+def census_files():
+    # Every census csv used (file2 plus any in census_extras)
+    return [file2] + sorted({abs_stats_dir / file for file, _, _ in census_extras} - {file2})
+
+def build_census_extras():
+    """
+    Loads the census_extras columns.
+
+    Returns:
+        list: (rows, values, sentence) for each entry in census_extras, with rows and values as returned by load_census.
+    """
+    columns = {}
+    for file, column, _ in census_extras:
+        columns.setdefault(abs_stats_dir / file, []).append(column)
+
+    loaded = {file: load_census(file, file_columns) for file, file_columns in columns.items()}
+
+    return [(loaded[abs_stats_dir / file][0], loaded[abs_stats_dir / file][1][column], sentence) for file, column, sentence in census_extras]
+
+def census_extras_text(code, suburb_name, gazetteer):
+    # The census_extras sentences for a SAL code, to go on the end of a description
+    sentences = []
+    for rows, values, sentence in gazetteer["census_extras"]:
+        if code in rows and not (isinstance(values[rows[code]], float) and math.isnan(values[rows[code]])):
+            sentences.append(sentence.format(suburb=suburb_name, value=values[rows[code]]))
+    return " ".join(sentences)
+
+def build_gazetteer(file1, file2, file3, statesLs):
+    """
+    Compiles the ABS csv's into a compact index holding only the columns this program uses.
+
+    Returns:
+        dict: {"sal": {name: [(code, state)]}, "sal_names": {name without its suffix: [SAL names]}, "population": {code: population}, "localities": {suburb: [(state, lga, lat, lng)]},
+               "places": [(suburb, state, lga, lat, lng)], "places_tree": KD-tree over places, "postcodes": {postcode: [index into places]},
+               "search": see build_search_index, "census_extras": see build_census_extras}
+    """
+    import pandas as pd  # only needed when (re)building the index
+
+    df1 = pd.read_csv(file1, usecols=['SAL_CODE_2021', 'SAL_NAME_2021', 'STATE_CODE_2021'], dtype=str)
+    census_rows, census = load_census(file2, ['Tot_P_P'])
+    df3 = pd.read_csv(file3, usecols=['suburb', 'state', 'local_goverment_area', 'lat', 'lng', 'population', 'postcode'])
+
+    sal = {}
+    for code, name, state in zip(df1['SAL_CODE_2021'], df1['SAL_NAME_2021'], df1['STATE_CODE_2021']):
+        # Skips "Other Territories" and the footer row, neither of which have a state in statesLs
+        if not state.isdigit() or not 1 <= int(state) <= len(statesLs):
+            continue
+        sal.setdefault(name, []).append((code, statesLs[int(state)-1]))
+
+    # "Springfield" -> ["Springfield (Ipswich - Qld)", "Springfield (NSW)", ...], as suburbs.csv (and so the search) uses the names without the suffix
+    sal_names = {}
+    for name in sal:
+        sal_names.setdefault(sal_base_name(name), []).append(name)
+
+    population = {code: int(census['Tot_P_P'][row]) for code, row in census_rows.items()}
+
+    localities = {}
+    places = []
+    # Population and states for every searchable name, used to rank search results
+    names = {name: [sum(population.get(code, 0) for code, _ in entries), {state for _, state in entries}] for name, entries in sal.items()}
+    postcodes = {}
+    for suburb, state, lga, lat, lng, suburb_population, postcode in zip(df3['suburb'], df3['state'], df3['local_goverment_area'], df3['lat'], df3['lng'], df3['population'], df3['postcode']):
+        # Skips the "Other Territories" (Jervis Bay, Christmas Island, etc), which have no state
+        if state not in statesLs:
+            continue
+        localities.setdefault(suburb, []).append((state, lga, float(lat), float(lng)))
+        postcodes.setdefault(normalise_postcode(postcode), []).append(len(places))
+        places.append((suburb, state, lga, float(lat), float(lng)))
+        entry = names.setdefault(suburb, [0, set()])
+        entry[0] = max(entry[0], int(suburb_population))
+        entry[1].add(state)
+
+    return {
+        "sal": sal,
+        "sal_names": sal_names,
+        "population": population,
+        "localities": localities,
+        "places": places,
+        "places_tree": build_kdtree([(lat, lng) for _, _, _, lat, lng in places]),
+        "postcodes": postcodes,
+        "search": build_search_index(names),
+        "census_extras": build_census_extras()
+    }
+
+def to_unit_vector(lat, lng):
+    # Point on a unit sphere. Straight line distances between these go up with the distance along the Earth's surface, so a KD-tree over them finds true nearest neighbours
+    lat, lng = math.radians(lat), math.radians(lng)
+    return (math.cos(lat) * math.cos(lng), math.cos(lat) * math.sin(lng), math.sin(lat))
+
+def build_kdtree(coordinates):
+    """
+    Builds a KD-tree over (lat, lng) coordinates. The tree is stored implicitly (plain lists, so it pickles into the gazetteer index):
+    the point at the middle of any range of "order" splits that range on axis depth % 3.
+
+    Returns:
+        dict: {"points": unit vectors, "order": point indexes in tree order}
+    """
+    points = [to_unit_vector(lat, lng) for lat, lng in coordinates]
+    order = list(range(len(points)))
+
+    def build(lo, hi, depth):
+        if hi - lo <= 1:
+            return
+        axis = depth % 3
+        order[lo:hi] = sorted(order[lo:hi], key=lambda i: points[i][axis])
+        mid = (lo + hi) // 2
+        build(lo, mid, depth + 1)
+        build(mid + 1, hi, depth + 1)
+
+    build(0, len(order), 0)
+
+    return {"points": points, "order": order}
+
+def kdtree_nearest(tree, lat, lng, k=1):
+    """
+    Finds the k points in the KD-tree nearest to (lat, lng).
+
+    Returns:
+        list: Indexes of the nearest points (into the coordinates the tree was built from), nearest first.
+    """
+    points, order = tree["points"], tree["order"]
+    target = to_unit_vector(lat, lng)
+    best = []  # max-heap of (-squared distance, index)
 
-    exact_matches = df1[df1['SAL_NAME_2021'] == suburb_name]
+    def search(lo, hi, depth):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        i = order[mid]
+        point = points[i]
+        distance = (point[0] - target[0])**2 + (point[1] - target[1])**2 + (point[2] - target[2])**2
 
-    if not exact_matches.empty:
-        code = exact_matches['SAL_CODE_2021'].values[0]
-        state = exact_matches['STATE_CODE_2021'].values[0]
+        if len(best) < k:
+            heapq.heappush(best, (-distance, i))
+        elif distance < -best[0][0]:
+            heapq.heapreplace(best, (-distance, i))
+
+        axis = depth % 3
+        diff = target[axis] - point[axis]
+        near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+
+        search(*near, depth + 1)
+        # Only cross the splitting plane if something on the other side could be closer
+        if len(best) < k or diff * diff < -best[0][0]:
+            search(*far, depth + 1)
+
+    search(0, len(order), 0)
+
+    return [i for _, i in sorted(best, reverse=True)]
+
+def reverse_geocode(lat, lng, gazetteer):
+    """
+    Finds the locality in suburbs.csv nearest to (lat, lng).
+
+    Returns:
+        tuple: (suburb, state, lga, lat, lng) of the nearest locality.
+    """
+    return gazetteer["places"][kdtree_nearest(gazetteer["places_tree"], lat, lng)[0]]
+
+def locate_coordinates(lat, lng, gazetteer):
+    """
+    Finds the locality nearest to (lat, lng), checking first that the coordinates are believable.
+
+    Returns:
+        tuple: (suburb, state, lga, lat, lng) of the nearest locality and None, or None and the reason the coordinates were rejected.
+    """
+    south, north, west, east = australia_bounds
+    if not (south <= lat <= north and west <= lng <= east):
+        return None, f"{lat}, {lng} is outside Australia - check the coordinates (latitude first, then longitude)."
+
+    place = reverse_geocode(lat, lng, gazetteer)
+    distance = haversine_distance_and_direction(lat, lng, place[3], place[4])[0]
+    if distance > max_locality_distance:
+        return None, f"The nearest locality to {lat}, {lng} is {place[0]}, {round(distance)}km away - check the coordinates."
+
+    return place, None
+
+def load_regional_centres(gazetteer):
+    """
+    Looks up the coordinates of the regional centres and builds a KD-tree over them.
+
+    Returns:
+        dict: {"centres": [(name, state, lat, lng)], "tree": KD-tree over the centres}
+    """
+    centres = []
+
+    if regional_centres is None:
+        for suburb, state, lga, lat, lng in gazetteer["places"]:
+            entry_population = locality_population(suburb, state, lga, gazetteer) or 0
+            citylat, citylong = city_lng_lat[state_capital_mapping[state]]
+            if entry_population >= regional_centre_min_population and haversine_distance_and_direction(citylat, citylong, lat, lng)[0] >= 60:
+                centres.append((suburb, state, lat, lng))
     else:
-        # Find partial matches
-        partial_matches = df1[df1['SAL_NAME_2021'].str.startswith(suburb_name)]
-
-        if not partial_matches.empty:
-            print("Multiple matches found:")
-            x = 1
-            for i, row in partial_matches.iterrows():
-                print(f"{x}. {row['SAL_NAME_2021']}")
-                x += 1
-
-            choice = int(input("Please select a match: "))
-            suburb_name = partial_matches.iloc[choice-1]['SAL_NAME_2021']
-            code = partial_matches.iloc[choice-1]['SAL_CODE_2021']
-            state = partial_matches.iloc[choice-1]['STATE_CODE_2021']
-        else:
-            print(f"Suburb '{suburb_name}' not found.")
-            return None, None, None
+        for name, suburb, state in regional_centres:
+            rows = [row for row in gazetteer["localities"].get(suburb, []) if row[0] == state]
+            if not rows:
+                print(f"Regional centre {suburb}, {state} not found in suburbs.csv - skipping it")
+                continue
+            _, _, lat, lng = rows[0]
+            centres.append((name, state, lat, lng))
 
-    stateName = statesLs[int(state)-1]
+    return {"centres": centres, "tree": build_kdtree([(lat, lng) for _, _, lat, lng in centres])}
 
-    # Find the population for the code in the second file
-    population = df2[df2['SAL_CODE_2021'] == 'SAL'+code]['Tot_P_P'].values[0]
+def nearest_regional_centre(lat, lng, capital_distance, centres):
+    """
+    Finds the regional centre nearest to (lat, lng), if it is within regional_town_radius and closer than the capital.
 
-    return population, suburb_name, stateName
+    Returns:
+        tuple: (name, distance, direction) with distance in km, or None.
+    """
+    if not centres or not centres["centres"]:
+        return None
 
-def get_location(suburb_name, file, state):
-    citylat, citylong = city_lng_lat[state_capital_mapping[state]]
+    name, _, centrelat, centrelng = centres["centres"][kdtree_nearest(centres["tree"], lat, lng)[0]]
+    distance, direction = haversine_distance_and_direction(centrelat, centrelng, lat, lng)
+
+    if distance > regional_town_radius or distance >= capital_distance:
+        return None
+
+    return name, distance, direction
+
+def normalise_postcode(postcode):
+    # suburbs.csv drops the leading 0 of NT postcodes (870 rather than 0870)
+    return str(int(postcode)).zfill(4)
+
+def parse_postcode(text):
+    # "2039" -> ('', '2039'), "Rozelle 2039" or "Rozelle, NSW 2039" -> ('Rozelle', '2039'), anything else -> None
+    match = re.fullmatch(r"\s*(.*?)[\s,]*(\d{3,4})\s*", text)
+    if not match or (match.group(1) and not re.search(r"[A-Za-z]", match.group(1))):
+        return None
+    suburb_name = re.sub(r"[\s,]+(" + "|".join(statesLs) + r")$", "", match.group(1).strip(), flags=re.IGNORECASE)
+    return suburb_name.strip(" ,"), normalise_postcode(match.group(2))
+
+def match_postcode(postcode, gazetteer, suburb_name=None):
+    """
+    Finds the localities with a postcode (optionally only those called suburb_name) without prompting.
+
+    Returns:
+        list: (suburb, state, lga, lat, lng) of each match.
+    """
+    places = [gazetteer["places"][i] for i in gazetteer["postcodes"].get(normalise_postcode(postcode), [])]
+
+    if suburb_name:
+        places = [place for place in places if place[0].lower() == suburb_name.lower()]
+
+    return places
+
+def parse_coordinates(text):
+    # "-27.4705, 153.0260" -> (-27.4705, 153.026), anything else -> None
+    match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*[,\s]\s*(-?\d+(?:\.\d+)?)\s*", text)
+    if not match:
+        return None
+    lat, lng = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+def build_search_index(names):
+    """
+    Builds the suburb search index: a sorted array of lowercase names for prefix searches (via bisect)
+    and a trigram index for finding misspelt names.
+
+    Args:
+        names (dict): {name: [population, set of states]} for every SAL and suburbs.csv name.
+    """
+    ordered = sorted(names, key=str.lower)
+
+    trigram_index = {}
+    for i, name in enumerate(ordered):
+        for trigram in trigrams(name.lower()):
+            trigram_index.setdefault(trigram, []).append(i)
+
+    return {
+        "keys": [name.lower() for name in ordered],
+        "names": ordered,
+        "population": [names[name][0] for name in ordered],
+        "states": [tuple(sorted(names[name][1])) for name in ordered],
+        "trigrams": trigram_index
+    }
+
+def edit_distance(a, b, limit):
+    # Levenshtein distance, only filling in the band of cells within limit of the diagonal (anything outside it is over the limit anyway).
+    # Returns limit + 1 if the distance is over the limit.
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
 
-    df = pd.read_csv(file)
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        char_a = a[i-1]
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        best = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = previous[j-1] + (char_a != b[j-1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j-1] + 1 < cost:
+                cost = current[j-1] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > limit:
+            return over
+        previous = current
 
-    exact_matches = df[df['suburb'] == suburb_name]
+    return min(previous[-1], over)
 
-    if len(exact_matches) == 0:
-        print('Cant find the suburb')
-        return None, None, None
+def search_suburbs(query, gazetteer, state=None, limit=10, fuzzy=True):
+    """
+    Finds suburb names starting with query (case insensitive), falling back to names within a couple of typos of query if fuzzy is True.
+    Results are ranked with the given state first, then by population.
+
+    Returns:
+        tuple: A list of matching names, and whether they were typo matches rather than prefix matches.
+    """
+    search = gazetteer["search"]
+    query = query.strip().lower()
+
+    if not query:
+        return [], False
+
+    def rank(i):
+        return (state is not None and state not in search["states"][i], -search["population"][i])
 
-    if len(exact_matches) != 1:
-        exact_matches = exact_matches[exact_matches['state'] == state]
-        if len(exact_matches) != 1:
-            print("Multiple matches found in same state:")
-            x=1
-            for i, row in exact_matches.iterrows():
-                print(f"{x}. {row['suburb']}, {row['local_goverment_area']}")
-                x += 1
-            choice = int(input("Please select a match: "))
-            suburbRow = exact_matches.iloc[choice-1]
+    start = bisect.bisect_left(search["keys"], query)
+    end = bisect.bisect_left(search["keys"], query + "\uffff", lo=start)
+
+    if end > start:
+        if limit is None:
+            ranked = sorted(range(start, end), key=rank)
         else:
-            suburbRow = exact_matches.iloc[0]
+            ranked = heapq.nsmallest(limit, range(start, end), key=rank)
+        return [search["names"][i] for i in ranked], False
+
+    if not fuzzy:
+        return [], False
+
+    # No prefix matches, so look for misspellings. Each typo can only break 3 trigrams, so any name within max_typos
+    # must share at least one of the query's 3*max_typos + 1 rarest trigrams. Only those (short) posting lists are counted.
+    max_typos = 1 if len(query) <= 5 else 2
+    postings = sorted((search["trigrams"].get(trigram, ()) for trigram in trigrams(query)), key=len)
+    shared = Counter()
+    for posting in postings[:3 * max_typos + 1]:
+        shared.update(posting)
+
+    matches = []
+    for i, _ in shared.most_common(30):
+        typos = edit_distance(query, search["keys"][i], max_typos)
+        if typos <= max_typos:
+            matches.append((typos,) + rank(i) + (i,))
+
+    return [search["names"][match[-1]] for match in sorted(matches)[:limit]], True
+
+def load_gazetteer(rebuild=False):
+    """
+    Loads the gazetteer index from disk, rebuilding it first if any of the source csv's have changed (or if rebuild is True).
+    """
+    sources = source_signature([file1, file3] + census_files())
+
+    if not rebuild and index_path.exists():
+        try:
+            with open(index_path, 'rb') as f:
+                index = pickle.load(f)
+            if index.get("version") == index_version and index.get("sources") == sources and index.get("census_extras") == census_extras:
+                return index["gazetteer"]
+        except Exception:
+            pass  # Corrupt, truncated or old index (unpickling those can raise almost anything), rebuild below
+
+    print("Building gazetteer index from the ABS csv's (only happens when they change)...")
+    gazetteer = build_gazetteer(file1, file2, file3, statesLs)
+
+    write_pickle(index_path, {"version": index_version, "sources": sources, "census_extras": census_extras, "gazetteer": gazetteer})
+
+    return gazetteer
+
+def write_pickle(path, data):
+    # Writes to a temporary file (with a name of its own, in case someone else is saving the same file at the same time) then swaps it in,
+    # so a half-written file is never picked up
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.stem + "_", suffix=".tmp", delete=False) as f:
+        try:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:  # Including KeyboardInterrupt, so the half-written file never gets left behind
+            f.close()
+            os.remove(f.name)
+            raise
+
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.remove(f.name)
+        raise
+
+def match_sal(suburb_name, gazetteer, state=None):
+    """
+    Finds the SAL entries for a suburb name without prompting.
+
+    Returns:
+        tuple: A list of (name, code, state) matches (exact matches if there are any, otherwise names starting with suburb_name), and whether they were exact.
+    """
+    sal = gazetteer["sal"]
+
+    if suburb_name in sal:
+        matches = [(suburb_name, code, stateName) for code, stateName in sal[suburb_name]]
+        exact = True
     else:
-        suburbRow = exact_matches.iloc[0]
+        names, _ = search_suburbs(suburb_name, gazetteer, state, limit=None, fuzzy=False)
+        matches = sal_entries(names, gazetteer)
+        exact = False
 
-    lga = suburbRow['local_goverment_area']
-    lng = suburbRow['lng']
-    lat = suburbRow['lat']
+    if state:
+        matches = [match for match in matches if match[2] == state]
 
-    distance, direction = haversine_distance_and_direction(citylat, citylong, lat, lng)
+    return matches, exact
 
-    return distance, direction, lga
+def sal_base_name(name):
+    # "Springfield (Ipswich - Qld)" -> "Springfield"
+    return re.sub(r"\s*\(.*\)$", "", name)
 
-def search_specials(location, lga):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def sal_entries(names, gazetteer):
+    """
+    Finds the SAL entries for names from search_suburbs. A name from suburbs.csv (e.g. "Springfield") isn't a SAL name itself,
+    so it stands for every SAL with that name once the suffix is taken off.
+
+    Returns:
+        list: (SAL name, code, state) for each entry, in the order of names, without repeats.
+    """
+    sal = gazetteer["sal"]
+    entries = []
+    seen = set()
+
+    for name in names:
+        sal_names = [name] if name in sal and sal_base_name(name) != name else gazetteer["sal_names"].get(name, [])
+        for sal_name in sal_names:
+            for code, stateName in sal[sal_name]:
+                if (sal_name, code) not in seen:
+                    seen.add((sal_name, code))
+                    entries.append((sal_name, code, stateName))
+
+    return entries
+
+def locality_sal_code(suburb_name, state, lga, gazetteer):
+    """
+    Finds the SAL code of a suburbs.csv locality without prompting, using its LGA to pick between SALs with the same name (e.g. "Springfield (Ipswich - Qld)").
+    """
+    sal = gazetteer["sal"]
+
+    matches = [code for code, stateName in sal.get(suburb_name, []) if stateName == state]
+
+    if not matches:
+        named = [(name, code) for name, code, stateName in sal_entries([suburb_name], gazetteer) if stateName == state]
+        lga_name = lga.split("(")[0].strip()
+        matches = [code for name, code in named if lga_name in name] or [code for _, code in named]
+
+    if len(matches) != 1:
+        return None
+
+    return matches[0]
+
+def locality_population(suburb_name, state, lga, gazetteer):
+    return gazetteer["population"].get(locality_sal_code(suburb_name, state, lga, gazetteer))
 
-    # Query the database for the given Location and LGA
-    cursor.execute(f"""
-        SELECT Description FROM {table_name}
-        WHERE Location = ? AND LGA = ?
-    """, (location, lga))
+def match_locality(suburb_name, gazetteer, state):
+    """
+    Finds the suburbs.csv rows for a suburb name without prompting, only narrowing down to the state if the name is used more than once.
+    """
+    matches = gazetteer["localities"].get(suburb_name, [])
+
+    if len(matches) > 1:
+        matches = [row for row in matches if row[0] == state]
 
-    result = cursor.fetchone()  # Fetch a single result
+    return matches
 
-    conn.close()
+def resolve_place(text, gazetteer):
+    """
+    Works out which locality text refers to (a suburb name, postcode, suburb and postcode, or coordinates) without prompting.
 
-    if result:
-        return result[0]  # Return the description
+    Returns:
+        dict: {"place": (suburb, state, lga, lat, lng), "code": SAL code} if it could be pinned down,
+              {"message": ..., "options": [(label, query)]} if there is more than one possibility (resolving query gives that option),
+              or {"error": message} if nothing was found.
+    """
+    coordinates = parse_coordinates(text)
+    postcode = parse_postcode(text) if not coordinates else None
+
+    if coordinates:
+        # GPS coordinates (e.g. from iAuditor) rather than a suburb name
+        place, error = locate_coordinates(*coordinates, gazetteer)
+        if error:
+            return {"error": error}
+        places = [place]
+    elif postcode:
+        # A postcode, or suburb and postcode
+        places = match_postcode(postcode[1], gazetteer, postcode[0])
+        if not places:
+            return {"error": f"No locality found for {text}."}
+        if len(places) > 1:
+            return {"message": f"Localities in postcode {postcode[1]}:", "options": [(f"{suburb}, {lga}", f"{lat}, {lng}") for suburb, _, lga, lat, lng in places]}
     else:
-        return None  # No matching entry found
-    
-def updateSpecial(suburb_name, lga, description):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Check if the entry exists
-    cursor.execute(f"""
-        SELECT 1 FROM {table_name} WHERE Location = ? AND LGA = ?
-    """, (suburb_name, lga))
-
-    if cursor.fetchone():
-        # Update existing entry
-        cursor.execute(f"""
-            UPDATE {table_name}
-            SET Description = ?
-            WHERE Location = ? AND LGA = ?
-        """, (description, suburb_name, lga))
+        matches, exact = match_sal(text, gazetteer)
+
+        if not matches:
+            names, _ = search_suburbs(text, gazetteer)
+            options = [(f"{name} ({stateName})", name) for name, _, stateName in sal_entries(names, gazetteer)]
+            if not options:
+                return {"error": f"Suburb '{text}' not found."}
+            return {"message": f"Suburb '{text}' not found. Did you mean:", "options": options}
+
+        if not exact:
+            return {"message": "Multiple matches found:", "options": [(name, name) for name, _, _ in matches]}
+
+        name, code, state = matches[0]
+        # Use the SAL's name without its "(Ipswich - Qld)" style suffix
+        suburb_name = sal_base_name(name)
+        localities = match_locality(suburb_name, gazetteer, state)
+
+        if len(localities) > 1 and name != suburb_name:
+            # The SAL's suffix usually names the LGA, which narrows it down
+            localities = [row for row in localities if row[1].split("(")[0].strip() in name] or localities
+
+        if not localities:
+            return {"error": "Suburb not found in location and LGA csv"}
+
+        if len(localities) > 1:
+            return {"message": "Multiple matches found in same state:", "options": [(f"{suburb_name}, {lga}", f"{lat}, {lng}") for _, lga, lat, lng in localities]}
+
+        _, lga, lat, lng = localities[0]
+        return {"place": (suburb_name, state, lga, lat, lng), "code": code}
+
+    suburb_name, state, lga, lat, lng = places[0]
+    return {"place": places[0], "code": locality_sal_code(suburb_name, state, lga, gazetteer)}
+
+def describe_place(place, code, gazetteer, centres=None, descriptions=None):
+    """
+    Gets the description of a locality: from the generated descriptions if it's there, otherwise the special description or a newly built one.
+
+    Returns:
+        tuple: The description, and whether it is a special description.
+    """
+    suburb_name, state, lga, lat, lng = place
+
+    if descriptions is not None and place[:3] in descriptions:
+        return descriptions[place[:3]]
+
+    short_lga = lga.split("(")[0].strip()
+    special = search_specials(suburb_name, short_lga)
+
+    if special:
+        return special, True
+
+    citylat, citylong = city_lng_lat[state_capital_mapping[state]]
+    distance, direction = haversine_distance_and_direction(citylat, citylong, lat, lng)
+    distance = round(distance)
+
+    centre = nearest_regional_centre(lat, lng, distance, centres)
+    population = gazetteer["population"].get(code)
+
+    return build_description(suburb_name, state, population, distance, direction, short_lga, centre, census_extras_text(code, suburb_name, gazetteer)), False
+
+def build_description(suburb_name, state, population, distance, direction, lga, centre=None, extras=''):
+    """
+    Writes the standard location description. distance should already be rounded and lga should have its "(City)", "(Shire)", etc stripped.
+    centre is the (name, distance, direction) of the nearest regional centre (see nearest_regional_centre), or None.
+    extras is added on the end (see census_extras_text).
+    """
+    description = standard_description(suburb_name, state, population, distance, direction, lga, centre)
+    return f"{description} {extras}" if extras else description
+
+def standard_description(suburb_name, state, population, distance, direction, lga, centre):
+    if distance < 60:
+        if suburb_name not in lga:
+            return f"The subject property is located in {suburb_name}, a suburb of {state_capital_mapping[state]}, {state_mapping[state]}. {suburb_name} has a current population of {population:,} and is located {distance}km {direction.lower()} of {state_capital_mapping[state]} CBD in the {lga} local government area."
+        else:
+            return f"The subject property is located in {suburb_name}, a suburb of {state_capital_mapping[state]}, {state_mapping[state]}. {suburb_name} has a current population of {population:,} and is located {distance}km {direction} of {state_capital_mapping[state]} CBD."
+    elif centre:
+        centre_name, centre_distance, centre_direction = centre
+        centre_distance = round(centre_distance)
+        # The centre itself is still just a town (not "Albury, a suburb of Albury" or "0km north of Albury")
+        at_centre = centre_distance == 0 or suburb_name == centre_name
+        kind = f"a suburb of {centre_name}, {state_mapping[state]}" if centre_distance < regional_suburb_radius and not at_centre else f"a town in {state_mapping[state]}"
+        centre_text = f" and {centre_distance}km {centre_direction.lower()} of {centre_name}" if not at_centre else ''
+        lga_text = f" in the {lga} local government area" if suburb_name not in lga else ''
+        return f"The subject property is located in {suburb_name}, {kind}. {suburb_name} has a current population of {population:,} and is located {distance}km {direction.lower()} of {state_capital_mapping[state]}{centre_text}{lga_text}."
     else:
-        # Insert new entry
-        cursor.execute(f"""
-            INSERT INTO {table_name} (Location, LGA, Description)
+        if suburb_name not in lga:
+            return f"The subject property is located in {suburb_name}, a town in {state_mapping[state]}. {suburb_name} has a current population of {population:,} and is located {distance}km {direction.lower()} of {state_capital_mapping[state]} in the {lga} local government area."
+        else:
+            return f"The subject property is located in {suburb_name}, a town in {state_mapping[state]}. {suburb_name} has a current population of {population:,} and is located {distance}km {direction.lower()} of {state_capital_mapping[state]}."
+
+class SpecialDescriptions:
+    """
+    The descriptions table of special_location_descriptions.db, held in memory.
+    One connection is kept open, edits are written to the database and the in-memory copy in one step,
+    and the table is only re-read when someone else has changed the database.
+    """
+    check_interval = 2  # Seconds between checks for changes made by other operators
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.open()
+
+    def open(self):
+        if self.conn:
+            self.conn.close()
+        self.conn = db_utils.connect(self.path, check_same_thread=False)
+        self.load()
+
+    def load(self):
+        self.descriptions = {(location, lga): description for location, lga, description in self.conn.execute(f"SELECT Location, LGA, Description FROM {db_utils.identifier(table_name)}")}
+        self.mark_seen()
+
+    def mark_seen(self):
+        # data_version only changes when another connection commits, so our own writes don't look like outside changes
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.file_signature = self.signature()
+        self.last_check = time.monotonic()
+
+    def signature(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def refresh(self, force=False):
+        """
+        Re-reads the table if another operator has changed it (checking at most every check_interval seconds unless force is True).
+
+        Returns:
+            dict: {(location, lga): description} of every entry that changed, with description None if it was deleted.
+        """
+        if not force and time.monotonic() - self.last_check < self.check_interval:
+            return {}
+
+        self.last_check = time.monotonic()
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+        if data_version != self.data_version:
+            old = self.descriptions
+            self.load()
+        elif self.signature() != self.file_signature:
+            # The file itself was replaced (e.g. synced down by OneDrive), so the open connection may not see it
+            old = self.descriptions
+            self.open()
+        else:
+            return {}
+
+        changes = {key: description for key, description in self.descriptions.items() if old.get(key) != description}
+        changes.update({key: None for key in old if key not in self.descriptions})
+        return changes
+
+    def get(self, location, lga):
+        return self.descriptions.get((location, lga))
+
+    def set(self, location, lga, description):
+        # Update if exists, insert otherwise
+        db_utils.run_transaction(self.conn, lambda cur: cur.execute(f"""
+            INSERT INTO {db_utils.identifier(table_name)} (Location, LGA, Description)
             VALUES (?, ?, ?)
-        """, (suburb_name, lga, description))
+            ON CONFLICT(Location, LGA) DO UPDATE SET Description = excluded.Description
+        """, (location, lga, description)))
+
+        self.descriptions[(location, lga)] = description
+        self.mark_seen()
+
+specials = None
 
-    conn.commit()
-    conn.close()
+def get_specials():
+    # The special descriptions are loaded once, the first time they're needed
+    global specials
+    if specials is None:
+        specials = SpecialDescriptions(db_path)
+    return specials
+
+def search_specials(location, lga):
+    return get_specials().get(location, lga)
+    
+def updateSpecial(suburb_name, lga, description, descriptions=None):
+    get_specials().set(suburb_name, lga, description)
 
     print(f"Entry updated/inserted for {suburb_name}, {lga}.")
 
-def main():
+    if descriptions is not None:
+        invalidate_descriptions(descriptions, {(suburb_name, lga): description})
+
+def description_signature():
+    # Everything a generated description depends on
+    return {
+        "version": (index_version, descriptions_version),
+        "sources": source_signature([file1, file3] + census_files()),
+        # The special descriptions themselves rather than the database file's mtime, which OneDrive also changes whenever it re-syncs the file
+        "specials": hashlib.sha1(repr(sorted(get_specials().descriptions.items())).encode("utf-8")).hexdigest(),
+        "settings": (regional_centres_mode, regional_centres, regional_centre_min_population, regional_suburb_radius, regional_town_radius, census_extras)
+    }
+
+def build_description_table(gazetteer, centres):
+    """
+    Generates the description of every locality in suburbs.csv (using the special description where there is one).
+
+    Returns:
+        dict: {(suburb, state, lga): (description, is_special)}, with the lga as it is in suburbs.csv (e.g. "Inner West (Area)").
+    """
+    special_descriptions = get_specials().descriptions
+
+    places = gazetteer["places"]
+    capitals = [city_lng_lat[state_capital_mapping[state]] for _, state, _, _, _ in places]
+    distances, directions = haversine_distance_and_direction_np(
+        [lat for lat, _ in capitals], [lng for _, lng in capitals],
+        [lat for _, _, _, lat, _ in places], [lng for _, _, _, _, lng in places])
+
+    table = {}
+    for (suburb, state, lga, lat, lng), distance, direction in zip(places, np.round(distances).astype(int), directions):
+        short_lga = lga.split("(")[0].strip()
+        special = special_descriptions.get((suburb, short_lga))
+
+        if special:
+            table[(suburb, state, lga)] = (special, True)
+            continue
+
+        code = locality_sal_code(suburb, state, lga, gazetteer)
+        population = gazetteer["population"].get(code)
+        if not population:
+            continue  # Can't be described without prompting, so left to main()
+
+        centre = nearest_regional_centre(lat, lng, int(distance), centres)
+        extras = census_extras_text(code, suburb, gazetteer)
+        table[(suburb, state, lga)] = (build_description(suburb, state, population, int(distance), str(direction), short_lga, centre, extras), False)
+
+    return table
+
+def save_description_table(descriptions):
+    write_pickle(descriptions_path, {"signature": description_signature(), "descriptions": descriptions})
+
+def load_description_table(gazetteer, centres, rebuild=False):
+    """
+    Loads the generated descriptions from disk, regenerating them first if anything they depend on has changed (or if rebuild is True).
+    """
+    if not rebuild and descriptions_path.exists():
+        try:
+            with open(descriptions_path, 'rb') as f:
+                saved = pickle.load(f)
+            if saved.get("signature") == description_signature():
+                return saved["descriptions"]
+        except (pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+            pass  # Corrupt or old table, rebuild below
+
+    descriptions = build_description_table(gazetteer, centres)
+    save_description_table(descriptions)
+
+    return descriptions
+
+def invalidate_descriptions(descriptions, changes):
+    """
+    Applies changed special descriptions ({(location, lga): description}, description None if deleted) to the generated descriptions,
+    so the saved table picks them up without being regenerated. Localities whose special was deleted are dropped, and so get described by main() from scratch.
+    """
+    for suburb, state, full_lga in list(descriptions):
+        key = (suburb, full_lga.split("(")[0].strip())
+        if key in changes:
+            if changes[key] is None:
+                del descriptions[(suburb, state, full_lga)]
+            else:
+                descriptions[(suburb, state, full_lga)] = (changes[key], True)
+
+    save_description_table(descriptions)
+
+def export_description_table(descriptions, output_path):
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["suburb", "state", "lga", "special", "description"])
+        for (suburb, state, lga), (description, special) in sorted(descriptions.items()):
+            writer.writerow([suburb, state, lga, special, description])
+
+    print(f"{len(descriptions)} descriptions saved to {output_path}")
+
+def read_batch_input(input_path):
+    """
+    Reads a list of suburbs (and optionally states) to describe. Accepts either a csv with "suburb", "state" and "postcode" columns and/or "lat" and "lng" columns,
+    or a text file with one suburb per line, optionally followed by the state and/or postcode (e.g. "Rozelle, NSW", "Rozelle NSW 2039" or just "2039"), or coordinates (e.g. "-33.86, 151.17").
+
+    Returns:
+        list: (suburb, state, coordinates, postcode) for each row, with state/postcode None where it wasn't given and coordinates None unless given instead of a suburb.
+    """
+    with open(input_path, newline='', encoding='utf-8-sig') as f:
+        lines = f.read().splitlines()
+
+    header = [column.strip().lower() for column in next(csv.reader(lines[:1]), [])]
+    lat_column = next((column for column in ('lat', 'latitude') if column in header), None)
+    lng_column = next((column for column in ('lng', 'lon', 'long', 'longitude') if column in header), None)
+
+    if 'suburb' in header or 'postcode' in header or (lat_column and lng_column):
+        rows = []
+        for row in csv.DictReader(lines[1:], fieldnames=header):
+            suburb_name = (row.get('suburb') or '').strip()
+            state = (row.get('state') or '').strip().upper()
+            postcode = (row.get('postcode') or '').strip()
+            coordinates = None
+            if lat_column and lng_column and not suburb_name and not postcode:
+                coordinates = parse_coordinates(f"{row[lat_column]},{row[lng_column]}")
+            rows.append((suburb_name, state if state in statesLs else None, coordinates, normalise_postcode(postcode) if postcode.isdigit() else None))
+        return rows
+
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        coordinates = parse_coordinates(line)
+        postcode = parse_postcode(line) if not coordinates else None
+        parts = re.split(r"[,\s]+", line)
+        if coordinates:
+            rows.append(('', None, coordinates, None))
+        elif postcode:
+            rows.append((postcode[0], None, None, postcode[1]))
+        elif len(parts) > 1 and parts[-1].upper() in statesLs:
+            rows.append((line[:line.rfind(parts[-1])].strip(" ,\t"), parts[-1].upper(), None, None))
+        else:
+            rows.append((line, None, None, None))
+    return rows
+
+def describe_batch(input_path, output_path, gazetteer, centres=None, descriptions=None):
+    """
+    Writes a location description for every suburb in input_path to the csv output_path, without prompting.
+    Suburbs that can't be pinned down to a single locality are flagged in the status column instead.
+    """
+    rows = read_batch_input(input_path)
+
+    results = []
+    resolved = []  # indexes into results that need a distance and direction
+
+    for suburb_name, state, coordinates, postcode in rows:
+        result = {"suburb": suburb_name, "state": state or '', "population": '', "lga": '', "distance_km": '', "direction": '', "status": '', "description": ''}
+        results.append(result)
+
+        if postcode:
+            places = match_postcode(postcode, gazetteer, suburb_name)
+            if state:
+                places = [place for place in places if place[1] == state]
+
+            if not places:
+                result["status"] = f"not found in postcode {postcode}"
+                continue
+
+            if len(places) > 1:
+                result["status"] = f"ambiguous: postcode {postcode} covers " + "; ".join(place[0] for place in places)
+                continue
+
+        if coordinates:
+            place, error = locate_coordinates(*coordinates, gazetteer)
+            if error:
+                result["status"] = error
+                continue
+            places = [place]
+
+        if coordinates or postcode:
+            suburb_name, state, lga, lat, lng = places[0]
+            code = locality_sal_code(suburb_name, state, lga, gazetteer)
+            population = gazetteer["population"].get(code)
+            result.update({"suburb": suburb_name, "state": state, "lga": lga.split("(")[0].strip()})
+
+            if not population:
+                result["status"] = "not found in population csv"
+                continue
+
+            result.update({"population": population, "code": code, "lat": lat, "lng": lng, "place": (suburb_name, state, lga)})
+            resolved.append(len(results) - 1)
+            continue
+
+        if not suburb_name:
+            result["status"] = "no suburb or coordinates given"
+            continue
+
+        matches, exact = match_sal(suburb_name, gazetteer, state)
+
+        if not matches:
+            suggestions, _ = search_suburbs(suburb_name, gazetteer, state, limit=3)
+            result["status"] = "not found in population csv" + (f" (did you mean {', '.join(suggestions)}?)" if suggestions else '')
+            continue
+
+        # A single partial match is fine if it's just the SAL's state suffix, e.g. "Birdwood (SA)"
+        if len(matches) == 1 and sal_base_name(matches[0][0]) == suburb_name:
+            exact = True
+
+        if len(matches) > 1 or not exact:
+            result["status"] = "ambiguous: " + "; ".join(sorted({name for name, _, _ in matches}))
+            continue
+
+        _, code, state = matches[0]
+        population = gazetteer["population"].get(code)
+
+        if not population:
+            result["status"] = "not found in population csv"
+            continue
+
+        localities = match_locality(suburb_name, gazetteer, state)
+
+        if not localities:
+            result["status"] = "not found in location and LGA csv"
+            continue
+
+        if len(localities) > 1:
+            result["status"] = "ambiguous: " + "; ".join(f"{suburb_name}, {lga}" for _, lga, _, _ in localities)
+            continue
+
+        _, lga, lat, lng = localities[0]
+        result.update({"state": state, "population": population, "code": code, "lga": lga.split("(")[0].strip(), "lat": lat, "lng": lng, "place": (suburb_name, state, lga)})
+        resolved.append(len(results) - 1)
+
+    # Distances and directions to every capital in one go
+    if resolved:
+        capitals = [city_lng_lat[state_capital_mapping[results[i]["state"]]] for i in resolved]
+        distances, bearings = haversine_distance_and_direction_np(
+            [lat for lat, _ in capitals], [lng for _, lng in capitals],
+            [results[i]["lat"] for i in resolved], [results[i]["lng"] for i in resolved])
+
+        for i, distance, direction in zip(resolved, np.round(distances).astype(int), bearings):
+            result = results[i]
+            result["distance_km"] = int(distance)
+            result["direction"] = str(direction)
+
+            if descriptions is not None and result["place"] in descriptions:
+                result["description"], special = descriptions[result["place"]]
+            else:
+                special = search_specials(result["suburb"], result["lga"])
+                centre = nearest_regional_centre(result["lat"], result["lng"], result["distance_km"], centres)
+                extras = census_extras_text(result["code"], result["suburb"], gazetteer)
+                result["description"] = special or build_description(result["suburb"], result["state"], result["population"], result["distance_km"], result["direction"], result["lga"], centre, extras)
+            result["status"] = "special" if special else "ok"
+
+    fieldnames = ["suburb", "state", "population", "lga", "distance_km", "direction", "status", "description"]
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+    flagged = sum(1 for result in results if result["status"] not in ("ok", "special"))
+    print(f"{len(results) - flagged} of {len(results)} suburbs described ({flagged} flagged). Saved to {output_path}")
+
+def choose_option(result):
+    # Asks which of resolve_place's options was meant, returning its query (or None for none of them)
+    print(result["message"])
+    x = 1
+    for label, _ in result["options"]:
+        print(f"{x}. {label}")
+        x += 1
+
+    choice = int(input("Please select a match (0 for none): "))
+    return result["options"][choice-1][1] if choice else None
+
+def print_search(query, gazetteer):
+    names, typos = search_suburbs(query, gazetteer)
+    if names:
+        print(f"{'Close' if typos else 'Matching'} suburbs: {', '.join(names)}")
+    else:
+        print(f"No suburbs match '{query}'")
+
+def main(gazetteer, centres=None, descriptions=None):
     while True:
         editing = False
 
         suburb_name = input().strip()
 
+        if not suburb_name:
+            continue
+
         if suburb_name == 'e': exit()
 
+        if suburb_name[0] == '?':
+            print_search(suburb_name[1:], gazetteer)
+            continue
+
         if suburb_name[0] == '#':
             editing = True
             suburb_name = suburb_name[1:]
 
-        population, suburb_name_long, state = get_population(suburb_name, file1, file2, statesLs)
-        
-        if not population:
-            print("Suburb not found in population csv")
-            continue
+        result = resolve_place(suburb_name, gazetteer)
 
-        distance, direction, lga = get_location(suburb_name, file3, state)
+        while "options" in result:
+            query = choose_option(result)
+            result = resolve_place(query, gazetteer) if query else {"error": "No match selected."}
 
-        if not distance:
-            print("Suburb not found in location and LGA csv")
+        if "error" in result:
+            print(result["error"])
             continue
 
-        distance = round(distance)
+        place, code = result["place"], result["code"]
 
-        lga = lga.split("(")[0].strip()
+        if parse_coordinates(suburb_name):
+            print(f"Nearest locality: {place[0]}, {place[1]} ({place[2]})")
+
+        suburb_name, state, lga, _, _ = place
+
+        if not gazetteer["population"].get(code):
+            print("Suburb not found in population csv")
+            continue
 
-        special = search_specials(suburb_name, lga)
+        lga = lga.split("(")[0].strip()
 
         if editing:
             print("Current description:")
 
-        if special:
-            description = special
+        # Pick up any special descriptions other operators have made since the last lookup
+        changes = get_specials().refresh()
+        if changes and descriptions is not None:
+            invalidate_descriptions(descriptions, changes)
 
-        else:
-            if distance < 60:
-                if suburb_name not in lga:
-                    description = f"The subject property is located in {suburb_name}, a suburb of {state_capital_mapping[state]}, {state_mapping[state]}. {suburb_name} has a current population of {population:,} and is located {distance}km {direction.lower()} of {state_capital_mapping[state]} CBD in the {lga} local government area."
-                else:
-                    description = f"The subject property is located in {suburb_name}, a suburb of {state_capital_mapping[state]}, {state_mapping[state]}. {suburb_name} has a current population of {population:,} and is located {distance}km {direction} of {state_capital_mapping[state]} CBD."
-            else:
-                if suburb_name not in lga:
-                    description = f"The subject property is located in {suburb_name}, a town in {state_mapping[state]}. {suburb_name} has a current population of {population:,} and is located {distance}km {direction.lower()} of {state_capital_mapping[state]} in the {lga} local government area."
-                else:
-                    description = f"The subject property is located in {suburb_name}, a town in {state_mapping[state]}. {suburb_name} has a current population of {population:,} and is located {distance}km {direction.lower()} of {state_capital_mapping[state]}."
+        description, _ = describe_place(place, code, gazetteer, centres, descriptions)
 
         print(description)
         
         if editing:
             print("Copy and paste the updated description. Then enter>ctrl-z>enter.")
             newDesc = sys.stdin.read().strip()
-            updateSpecial(suburb_name, lga, newDesc)
+            updateSpecial(suburb_name, lga, newDesc, descriptions)
 
         else:
             pyperclip.copy(description)
 
+class LocationServer(ThreadingHTTPServer):
+    """
+    Keeps the gazetteer, regional centres and descriptions in memory and answers requests from any number of clients at once.
+    Lookups that touch the special descriptions are done one at a time (they take well under a millisecond).
+    """
+    daemon_threads = True
+
+    def __init__(self, address, gazetteer, centres=None, descriptions=None):
+        super().__init__(address, LocationRequestHandler)
+        self.gazetteer = gazetteer
+        self.centres = centres
+        self.descriptions = descriptions
+        self.lock = threading.Lock()
+
+    def refresh_specials(self):
+        # Pick up any special descriptions made directly in the database since the last request
+        changes = get_specials().refresh()
+        if changes and self.descriptions is not None:
+            invalidate_descriptions(self.descriptions, changes)
+
+    def describe(self, text):
+        result = resolve_place(text, self.gazetteer)
+        if "place" not in result:
+            return result
+
+        place, code = result["place"], result["code"]
+        suburb_name, state, lga, lat, lng = place
+
+        if not self.gazetteer["population"].get(code):
+            return {"error": "Suburb not found in population csv"}
+
+        with self.lock:
+            self.refresh_specials()
+            description, special = describe_place(place, code, self.gazetteer, self.centres, self.descriptions)
+
+        return {"suburb": suburb_name, "state": state, "lga": lga.split("(")[0].strip(), "lat": lat, "lng": lng, "description": description, "special": special}
+
+    def search(self, query):
+        names, typos = search_suburbs(query, self.gazetteer)
+        return {"names": names, "fuzzy": typos}
+
+    def update(self, suburb_name, lga, description):
+        with self.lock:
+            self.refresh_specials()
+            updateSpecial(suburb_name, lga, description, self.descriptions)
+        return {"message": f"Entry updated/inserted for {suburb_name}, {lga}."}
+
+class LocationRequestHandler(BaseHTTPRequestHandler):
+    # GET /describe?q=..., GET /search?q=... and POST /update {"suburb", "lga", "description"}, all answered with json
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query).get("q", [""])[0].strip()
+
+        if url.path == "/describe":
+            self.reply(self.server.describe(query) if query else {"error": "Nothing to describe"})
+        elif url.path == "/search":
+            self.reply(self.server.search(query))
+        else:
+            self.reply({"error": f"Unknown request {url.path}"}, 404)
+
+    def do_POST(self):
+        if self.path != "/update":
+            self.reply({"error": f"Unknown request {self.path}"}, 404)
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            suburb_name, lga, description = body["suburb"], body["lga"], body["description"].strip()
+        except (ValueError, KeyError, AttributeError):
+            self.reply({"error": "An update needs a suburb, lga and description"}, 400)
+            return
+
+        self.reply(self.server.update(suburb_name, lga, description))
+
+    def reply(self, result, status=200):
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(gazetteer, centres=None, descriptions=None):
+    server = LocationServer((service_host, service_port), gazetteer, centres, descriptions)
+    print(f"Serving location descriptions on {service_host}:{service_port} (ctrl-c to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def request_service(url, path, params=None, body=None, timeout=None):
+    """
+    Sends one request to the location description service.
+
+    Returns:
+        dict: Its json reply ({"error": message} if it couldn't answer). Raises OSError (e.g. URLError) if the service can't be reached.
+    """
+    if params:
+        path += "?" + urllib.parse.urlencode(params)
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url.rstrip("/") + path, data=data, headers={"Content-Type": "application/json"} if data else {})
+
+    try:
+        with urllib.request.urlopen(request, timeout=timeout or service_timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            return json.loads(e.read())
+        except ValueError:
+            return {"error": f"The location description service couldn't answer ({e.code} {e.reason})"}
+    except ValueError:
+        return {"error": "The location description service sent back something that isn't json"}
+
+def service_running(url):
+    try:
+        request_service(url, "/search", {"q": ""}, timeout=probe_timeout)
+        return True
+    except OSError:
+        return False
+
+def client(url):
+    # The same prompts as main(), with the lookups done by the service. Only returns if the service stops responding.
+    try:
+        client_loop(url)
+    except OSError as e:
+        print(f"The location description service isn't responding ({e}) - looking up suburbs here instead. Please enter the suburb again.")
+
+def client_loop(url):
+    while True:
+        editing = False
+
+        suburb_name = input().strip()
+
+        if not suburb_name:
+            continue
+
+        if suburb_name == 'e': exit()
+
+        if suburb_name[0] == '?':
+            result = request_service(url, "/search", {"q": suburb_name[1:]})
+            if "error" in result:
+                print(result["error"])
+            elif result["names"]:
+                print(f"{'Close' if result['fuzzy'] else 'Matching'} suburbs: {', '.join(result['names'])}")
+            else:
+                print(f"No suburbs match '{suburb_name[1:]}'")
+            continue
+
+        if suburb_name[0] == '#':
+            editing = True
+            suburb_name = suburb_name[1:]
+
+        result = request_service(url, "/describe", {"q": suburb_name})
+
+        while "options" in result:
+            query = choose_option(result)
+            result = request_service(url, "/describe", {"q": query}) if query else {"error": "No match selected."}
+
+        if "error" in result:
+            print(result["error"])
+            continue
+
+        if parse_coordinates(suburb_name):
+            print(f"Nearest locality: {result['suburb']}, {result['state']} ({result['lga']})")
+
+        if editing:
+            print("Current description:")
+
+        print(result["description"])
+
+        if editing:
+            print("Copy and paste the updated description. Then enter>ctrl-z>enter.")
+            newDesc = sys.stdin.read().strip()
+            reply = request_service(url, "/update", body={"suburb": result["suburb"], "lga": result["lga"], "description": newDesc})
+            print(reply.get("message") or reply.get("error"))
+
+        else:
+            pyperclip.copy(result["description"])
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Location descriptions for iAuditor")
+    parser.add_argument("--build-index", action="store_true", help="Rebuild the gazetteer index from the ABS csv's and exit")
+    parser.add_argument("--batch", metavar="INPUT", help="Describe every suburb in a csv (suburb, state, postcode or lat/lng columns) or text list (one \"suburb, state\" per line)")
+    parser.add_argument("--output", metavar="OUTPUT", help="Where to save the batch descriptions (defaults to INPUT_descriptions.csv)")
+    parser.add_argument("--export-descriptions", metavar="OUTPUT", help="Save the generated description of every locality to a csv and exit")
+    parser.add_argument("--serve", action="store_true", help="Keep everything loaded and answer lookups from other copies of this program")
+    parser.add_argument("--local", action="store_true", help="Don't use the location description service even if it's running")
+    parser.add_argument("--service-url", default=service_url, help=f"Where the location description service is running (defaults to {service_url})")
+    args = parser.parse_args()
+
+    if args.build_index:
+        load_gazetteer(rebuild=True)
+        print(f"Gazetteer index saved to {index_path}")
+    else:
+        if not (args.serve or args.local or args.batch or args.export_descriptions) and service_running(args.service_url):
+            client(args.service_url)
+
+        gazetteer = load_gazetteer()
+        centres = load_regional_centres(gazetteer) if regional_centres_mode else None
+        descriptions = load_description_table(gazetteer, centres)
+
+        if args.export_descriptions:
+            export_description_table(descriptions, args.export_descriptions)
+        elif args.batch:
+            output_path = args.output or str(Path(args.batch).with_suffix('')) + "_descriptions.csv"
+            describe_batch(args.batch, output_path, gazetteer, centres, descriptions)
+        elif args.serve:
+            serve(gazetteer, centres, descriptions)
+        else:
+            main(gazetteer, centres, descriptions)
\ No newline at end of file
@@ -0,0 +1,137 @@
+#####################
+# Checks that several people can use risk_improvements.db and special_location_descriptions.db at the same time without "database is locked" stalls.
+# It starts several processes (one per pretend operator) which each look up and save RIs and location descriptions as fast as they can for a few seconds,
+# then reports how many lookups/saves got done, how long they took, and how many failed because the database was locked.
+# It works on copies of the databases (in a temporary folder), so the real ones aren't touched.
+# Run with --plain to compare against plain sqlite3 connections (no busy timeout or retries).
+#####################
+
+import os
+import re
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+import db_utils
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+risk_db = os.path.join(base_dir, "Databases", "risk_improvements.db")
+specials_db = os.path.join(base_dir, "Databases", "special_location_descriptions.db")
+
+def highest_table(conn):
+    names = [name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')") if re.fullmatch(r"RI\d+", name)]
+    return max(names)
+
+def open_database(path, plain):
+    if plain:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = delete")
+        return conn
+    return db_utils.connect(path)
+
+def save(conn, plain, sql, params):
+    if plain:
+        conn.execute(sql, params)
+        conn.commit()
+    else:
+        db_utils.run_transaction(conn, lambda cur: cur.execute(sql, params))
+
+def operator(number, risk_path, specials_path, seconds, write_ratio, plain, results):
+    # One pretend operator: looks things up, and every so often saves something
+    risk = open_database(risk_path, plain)
+    specials = open_database(specials_path, plain)
+
+    table = highest_table(risk)
+    codes = [code for code, in risk.execute(f"SELECT code FROM {db_utils.identifier(table)}")]
+    places = specials.execute("SELECT Location, LGA FROM descriptions").fetchall()
+
+    times = {"read": [], "write": []}
+    locked = 0
+    end = time.perf_counter() + seconds
+
+    while time.perf_counter() < end:
+        writing = random.random() < write_ratio
+        start = time.perf_counter()
+
+        try:
+            if not writing:
+                risk.execute(f"SELECT title, description FROM {db_utils.identifier(table)} WHERE code = ?", (random.choice(codes),)).fetchone()
+                specials.execute("SELECT Description FROM descriptions WHERE Location = ? AND LGA = ?", random.choice(places)).fetchone()
+            elif random.random() < 0.5:
+                code = random.choice(codes)
+                save(risk, plain, "INSERT OR IGNORE INTO acknowledged_changes (version, code, operator) VALUES (?, ?, ?)", (table, code, f"benchmark {number}"))
+                save(risk, plain, "DELETE FROM acknowledged_changes WHERE version = ? AND code = ? AND operator = ?", (table, code, f"benchmark {number}"))
+            else:
+                save(specials, plain, """
+                    INSERT INTO descriptions (Location, LGA, Description) VALUES (?, ?, ?)
+                    ON CONFLICT(Location, LGA) DO UPDATE SET Description = excluded.Description
+                """, (f"Benchmark {number}", "Benchmark", f"Saved at {time.time()}"))
+        except sqlite3.OperationalError as e:
+            if not db_utils.is_locked(e):
+                raise
+            locked += 1
+            if plain:
+                risk.rollback()
+                specials.rollback()
+            continue
+
+        times["write" if writing else "read"].append(time.perf_counter() - start)
+
+    risk.close()
+    specials.close()
+    results.put((times, locked))
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def run(processes, seconds, write_ratio, plain):
+    folder = tempfile.mkdtemp(prefix="db_benchmark_")
+    try:
+        risk_path = shutil.copy(risk_db, folder)
+        specials_path = shutil.copy(specials_db, folder)
+
+        # The acknowledged changes table is made by autoCopy3 the first time it runs, so it might not be in the database yet
+        conn = sqlite3.connect(risk_path)
+        conn.execute("CREATE TABLE IF NOT EXISTS acknowledged_changes (version TEXT NOT NULL, code TEXT NOT NULL, operator TEXT NOT NULL, PRIMARY KEY (version, code, operator)) WITHOUT ROWID")
+        conn.commit()
+        conn.close()
+
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=operator, args=(i, risk_path, specials_path, seconds, write_ratio, plain, results)) for i in range(processes)]
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print(f"{processes} operators for {seconds}s, {write_ratio:.0%} saves, {'plain' if plain else 'db_utils'} connections:")
+    for kind in ("read", "write"):
+        times = [t for outcome, _ in outcomes for t in outcome[kind]]
+        print(f"  {kind}s: {len(times) / seconds:,.0f}/s, median {percentile(times, 0.5) * 1000:.2f}ms, 99th percentile {percentile(times, 0.99) * 1000:.2f}ms, slowest {max(times, default=0) * 1000:.0f}ms")
+    locked = sum(count for _, count in outcomes)
+    print(f"  \"database is locked\" errors: {locked}")
+    return locked
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process read/write benchmark for the shared databases")
+    parser.add_argument("--processes", type=int, default=8, help="Number of operators at once")
+    parser.add_argument("--seconds", type=float, default=5, help="How long each operator runs for")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="Fraction of operations that save something")
+    parser.add_argument("--plain", action="store_true", help="Use plain sqlite3 connections instead of db_utils")
+    args = parser.parse_args()
+
+    for path in (risk_db, specials_db):
+        if not os.path.exists(path):
+            sys.exit(f"Can't find {path}")
+
+    locked = run(args.processes, args.seconds, args.write_ratio, args.plain)
+    sys.exit(1 if locked else 0)
@@ -0,0 +1,107 @@
+#####################
+# Shared SQLite helpers for autoCopy3.py and autoLocationDescription.py (keep this file next to them).
+# Every connection to risk_improvements.db and special_location_descriptions.db should come from connect(), so they're all set up the same way:
+#   - a rollback journal (not WAL): the databases are in a OneDrive folder, and WAL keeps recent changes in separate -wal/-shm files that OneDrive
+#     syncs on their own, so other computers would see stale or broken databases (SQLite doesn't support WAL on network or synced folders)
+#   - busy_timeout: waits for a lock instead of failing straight away with "database is locked"
+#   - mmap_size: reads come straight from the OS file cache
+#   - a statement cache: the same SQL text is only prepared once per connection (so keep values as ? parameters, not in the SQL)
+# Writes should go through transaction(), which takes the write lock up front, groups everything inside it into one commit, and retries if the database stays locked.
+# Run db_benchmark.py to check how several people reading and writing at once performs.
+#####################
+
+import re
+import time
+import random
+import sqlite3
+from contextlib import contextmanager
+
+journal_mode = "delete"  # Also switches back any database left in WAL mode. Set to None to leave the database's journal mode as it is
+synchronous = "full"  # Needed with a rollback journal to be safe if the computer loses power mid-write
+busy_timeout = 5000  # Milliseconds to wait for a lock before giving up
+mmap_size = 64 * 1024 * 1024
+statement_cache = 256
+
+# Retry policy for when a lock is held longer than busy_timeout
+retries = 5
+retry_delay = 0.05  # Seconds before the first retry (doubles each time, plus some randomness so retries don't line up)
+
+def connect(path, journal=journal_mode, check_same_thread=True):
+    """
+    Opens a tuned connection.
+
+    Args:
+        path (str): The database file.
+        journal (str): The journal mode to use (None to leave it as it is, e.g. for a private copy nobody else opens).
+        check_same_thread (bool): Passed to sqlite3.connect (False to share the connection between threads).
+
+    Returns:
+        sqlite3.Connection: The connection.
+    """
+    conn = sqlite3.connect(path, timeout=busy_timeout / 1000, cached_statements=statement_cache, check_same_thread=check_same_thread)
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+
+    if journal:
+        # Changing the journal mode needs a moment with nobody else writing, so don't hold up opening the database if that doesn't happen
+        try:
+            retry(conn.execute, f"PRAGMA journal_mode = {journal}")
+        except sqlite3.OperationalError:
+            pass
+
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+
+    return conn
+
+def is_locked(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+def retry(function, *args, **kwargs):
+    # Calls function, trying again (up to retries times) if the database is locked
+    delay = retry_delay
+    for attempt in range(retries + 1):
+        try:
+            return function(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if not is_locked(e) or attempt == retries:
+                raise
+            time.sleep(delay * (1 + random.random()))
+            delay *= 2
+
+@contextmanager
+def transaction(conn):
+    """
+    Groups writes into one transaction, committed at the end of the with block (or rolled back if anything in it fails).
+    The write lock is taken at the start (BEGIN IMMEDIATE, retried while someone else has it), so nothing in the block can fail halfway with "database is locked".
+
+        with transaction(conn) as cur:
+            cur.execute(...)
+            cur.executemany(...)
+    """
+    if conn.in_transaction:
+        # Committing it here would save someone else's half-finished changes
+        raise sqlite3.ProgrammingError("transaction() called while the connection already has a transaction open")
+
+    cur = conn.cursor()
+    retry(cur.execute, "BEGIN IMMEDIATE")
+    try:
+        yield cur
+        conn.commit()
+    except BaseException:
+        # Anything at all (including KeyboardInterrupt) undoes the whole transaction
+        conn.rollback()
+        raise
+
+def run_transaction(conn, function, *args):
+    # Runs function(cur, *args) in a transaction. Only BEGIN IMMEDIATE is retried (in transaction()): once it has the write lock, nothing
+    # else in the transaction waits on another connection for longer than busy_timeout, so retrying the whole thing as well would only
+    # multiply the wait (up to minutes) when someone else holds the lock
+    with transaction(conn) as cur:
+        return function(cur, *args)
+
+def identifier(name):
+    # Quotes a table/column name for use in SQL, refusing anything that isn't a plain name (names can't be ? parameters)
+    if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name or ''):
+        raise ValueError(f"Invalid table name: {name!r}")
+    return f'"{name}"'
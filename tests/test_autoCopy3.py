@@ -0,0 +1,271 @@
+import json
+import shutil
+import sqlite3
+import sys
+import time
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "Python Files"))
+
+import autoCopy3 as ac
+import db_utils
+
+
+def test_uppercase_comment_stays_with_its_item():
+    text = "\n".join([
+        "FIRE SAFETY",
+        "Smoke (A014)",
+        "No",
+        "N/A",
+        "some comment",
+        "Emergency lighting (M094)",
+        "No",
+    ])
+    flagged = ac.parse_flagged_text(ac.iter_lines(text))
+    assert flagged["matches"] == ["A014", "M094"]
+    assert flagged["comments"]["A014"] == ["N/A", "some comment"]
+    assert flagged["sections"]["M094"] == "FIRE SAFETY"
+
+
+def test_uppercase_line_before_an_item_is_a_heading():
+    text = "\n".join([
+        "FIRE SAFETY",
+        "Smoke (A014)",
+        "No",
+        "RCD OK",
+        "ELECTRICAL",
+        "Switchboard (M069)",
+        "No",
+    ])
+    flagged = ac.parse_flagged_text(ac.iter_lines(text))
+    assert flagged["comments"]["A014"] == ["RCD OK"]
+    assert flagged["sections"]["A014"] == "FIRE SAFETY"
+    assert flagged["sections"]["M069"] == "ELECTRICAL"
+
+
+def test_invalid_json_is_read_as_pasted_text(capsys):
+    text = "[Site: 12 Smith St\nSmoke (A014)\nNo\nbattery flat"
+    flagged = ac.parse_flagged_items(text)
+    assert flagged["matches"] == ["A014"]
+    assert flagged["comments"]["A014"] == "battery flat"
+    assert "aren't valid JSON" in capsys.readouterr().out
+
+
+def test_json_export_skips_entries_that_arent_items():
+    text = '[1, {"label": "Smoke (A014)", "responses": {"failed": true, "text": "flat"}}]'
+    flagged = ac.parse_flagged_items(text)
+    assert flagged["matches"] == ["A014"]
+    assert flagged["comments"]["A014"] == "flat"
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    # A copy of the default RI database, opened directly (no local replica) as the program's connection
+    path = tmp_path / "risk_improvements.db"
+    shutil.copy(Path(__file__).resolve().parents[1] / "Defaults" / "risk_improvements_DEF.db", path)
+    conn = db_utils.connect(str(path))
+    monkeypatch.setattr(ac, "db_path", str(path))
+    monkeypatch.setattr(ac, "conn", conn)
+    monkeypatch.setattr(ac, "cursor", conn.cursor())
+    monkeypatch.setattr(ac, "replica", None)
+    ac.version_hashes_cache.clear()
+    ac.diff_cache.clear()
+    yield path
+    conn.close()
+
+
+def test_batch_reports_a_bad_job_and_carries_on(database, tmp_path, capsys):
+    jobs = tmp_path / "jobs"
+    jobs.mkdir()
+    (jobs / "good.txt").write_text("Smoke (A014)\nNo\nbattery flat\n")
+    (jobs / "broken.json").write_text("[broken")
+    (jobs / "blocked.txt").write_text("Switchboard (M069)\nNo\n")
+    (jobs / "blocked_RIs.txt").mkdir()  # So saving that job's RIs fails
+    (jobs / "photo.jpg").write_bytes(b"\xff\xd8 not a job (M010)")
+
+    ac.batch(str(jobs), workers=1)
+
+    out = capsys.readouterr().out
+    assert "Preparing 3 jobs" in out
+    assert "blocked.txt: Warning: couldn't be prepared" in out
+    assert "good.txt: 1 RIs -> good_RIs.txt" in out
+    assert "Done: 2 of 3 jobs prepared, 1 failed" in out
+    assert "battery flat" in (jobs / "good_RIs.txt").read_text()
+    assert not (jobs / "photo_RIs.txt").exists()
+
+
+def latest_rows():
+    ac.cursor.execute(f"SELECT code, title, description FROM {ac.get_highest_table()}")
+    return [{"code": code, "title": title, "description": description} for code, title, description in ac.cursor.fetchall()]
+
+
+@pytest.mark.parametrize("content, problem", [
+    ("[]", "There are no risk improvements in the list"),
+    ("[1, 2]", "Can't read it: it should be a list of objects"),
+    ('{"M001": "Smoke alarms"}', "Can't read it: each code should map to an object"),
+    ("[broken", "Can't read it"),
+])
+def test_import_refuses_a_master_list_it_cant_use(database, tmp_path, capsys, content, problem):
+    path = tmp_path / "master.json"
+    path.write_text(content)
+    latest = ac.get_highest_table()
+
+    assert ac.import_master_list(str(path), "RI20251201") == 0
+    assert problem in capsys.readouterr().out
+    assert ac.get_highest_table() == latest
+
+
+def test_import_refuses_an_empty_sheet(database, tmp_path, capsys):
+    openpyxl = pytest.importorskip("openpyxl")
+    path = tmp_path / "master.xlsx"
+    openpyxl.Workbook().save(path)
+
+    assert ac.import_master_list(str(path), "RI20251201") == 0
+    assert "the sheet is empty" in capsys.readouterr().out
+
+
+def test_import_refuses_a_list_missing_most_codes_unless_allowed(database, tmp_path, capsys):
+    path = tmp_path / "master.json"
+    path.write_text(json.dumps(latest_rows()[:10]))
+
+    assert ac.import_master_list(str(path), "RI20251201") == 0
+    assert "--allow-removals" in capsys.readouterr().out
+    assert ac.get_highest_table() != "RI20251201"
+
+    assert ac.import_master_list(str(path), "RI20251201", allow_removals=True) == 1
+    assert ac.get_highest_table() == "RI20251201"
+
+
+def test_import_publishes_a_new_version_and_diffs_it(database, tmp_path):
+    rows = latest_rows()
+    rows[0]["title"] += " (updated)"
+    path = tmp_path / "master.json"
+    path.write_text(json.dumps(rows))
+
+    assert ac.import_master_list(str(path), "RI20251201") == 1
+    assert ac.get_highest_table() == "RI20251201"
+    assert ac.changed_codes("RI20251201") == {rows[0]["code"]}
+    assert ac.getRI(rows[0]["code"], "RI20251201")[0].endswith("(updated)")
+
+
+@pytest.fixture
+def engine(database, monkeypatch):
+    monkeypatch.setattr(ac, "use_local_replica", False)
+    monkeypatch.setattr(ac, "warnings_allowed", False)
+    monkeypatch.setitem(sys.modules, "pyperclip", types.SimpleNamespace(copy=lambda text: None))  # No clipboard needed
+    engine = ac.Engine()
+    engine.start()
+    yield engine
+    engine.close()
+
+
+def test_editing_an_ri_updates_which_codes_are_changed(engine):
+    code = next(code for code in ac.version_hashes(engine.table_name) if code not in engine.difset)
+    for text in ["e", code, "keep", "A rewritten description"]:
+        engine.submit(text)
+
+    assert code in engine.difset
+    assert any("changed" in line for line in engine.suggest(code))
+
+
+def test_replica_saves_changes_in_order_and_drops_ones_that_cant_be_saved(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(ac.LocalReplica, "check_interval", 0.05)
+    shared = tmp_path / "shared.db"
+    with sqlite3.connect(shared) as conn:
+        conn.execute("CREATE TABLE t (x)")
+    replica = ac.LocalReplica(str(shared), str(tmp_path / "local"))
+
+    replica.submit(lambda cur: cur.execute("INSERT INTO t VALUES (1)"))
+    replica.submit(lambda cur: cur.execute(f"INSERT INTO {db_utils.identifier('bad name')} VALUES (2)"))
+    replica.submit(lambda cur: cur.execute("INSERT INTO missing VALUES (3)"))
+    replica.submit(lambda cur: cur.execute("INSERT INTO t VALUES (4)"))
+    assert replica.flush(5)
+
+    # Held back while someone else has the database locked, then saved
+    blocker = sqlite3.connect(shared, isolation_level=None)
+    blocker.execute("BEGIN EXCLUSIVE")
+    replica.submit(lambda cur: cur.execute("INSERT INTO t VALUES (5)"))
+    assert not replica.flush(0.5)
+    blocker.execute("ROLLBACK")
+    blocker.close()
+    assert replica.flush(15)
+
+    out = capsys.readouterr().out
+    assert "Invalid table name" in out and "no such table: missing" in out
+    with sqlite3.connect(shared) as conn:
+        assert conn.execute("SELECT x FROM t").fetchall() == [(1,), (4,), (5,)]
+
+    # A newer copy with every change in it is picked up
+    deadline = time.monotonic() + 5
+    while not replica.take() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    with sqlite3.connect(replica.current) as conn:
+        assert conn.execute("SELECT x FROM t").fetchall() == [(1,), (4,), (5,)]
+
+
+def version_rows(version):
+    ac.cursor.execute(f"SELECT code, title, description FROM {version} ORDER BY code")
+    return ac.cursor.fetchall()
+
+
+def test_version_store_views_match_the_tables_they_replace(database):
+    before = {version: version_rows(version) for version in ac.get_versions()}
+
+    ac.migrate_to_version_store()
+
+    assert ac.uses_version_store()
+    assert ac.get_versions() == list(before)
+    for version, rows in before.items():
+        assert ac.is_version_view(version)
+        assert version_rows(version) == rows
+
+
+def test_version_store_answers_as_of_a_date_and_edits_one_version(database):
+    ac.migrate_to_version_store()
+    first, second = ac.get_versions()[-2:]
+    code, title, description = version_rows(second)[0]
+
+    with db_utils.transaction(ac.conn) as cur:
+        ac.edit_version_row(cur, second, code, "Edited title", description)
+
+    assert ac.getRI(code, second) == ("Edited title", description)
+    assert ac.getRI(code, first) == dict((c, (t, d)) for c, t, d in version_rows(first)).get(code, (None, None))
+    assert ac.getRI_as_of(code, ac.version_date(second)) == ("Edited title", description)
+    assert ac.getRI_as_of(code, "2000-01-01") == (None, None)
+
+
+def test_acknowledgements_are_per_operator_and_unacknowledging_clears_them_all(database, monkeypatch):
+    db_utils.run_transaction(ac.conn, ac.setup_acknowledged)
+    version = ac.get_highest_table()
+
+    ac.acknowledge_change(version, "M010")
+    monkeypatch.setattr(ac, "operator", "someone else")
+    ac.acknowledge_change(version, "M010")
+    ac.acknowledge_change(version, "M010")  # Twice by the same person is still one row
+
+    ac.cursor.execute("SELECT COUNT(*) FROM acknowledged_changes WHERE version = ? AND code = 'M010'", (version,))
+    assert ac.cursor.fetchone()[0] == 2
+    assert ac.unacknowledged(version, {"M010", "M011"}) == {"M011"}
+    assert ac.unacknowledged(ac.get_previous_table(version), {"M010"}) == {"M010"}
+
+    assert ac.unacknowledge_change(version, "M010") == 1
+    assert ac.unacknowledge_change(version, "M010") == 0
+    assert ac.unacknowledged(version, {"M010", "M011"}) == {"M010", "M011"}
+
+
+def test_acknowledged_code_stops_being_flagged(engine, capsys):
+    code = ac.orderCodes(engine.difset)[0]
+
+    engine.submit(code)
+    assert "Please check" in capsys.readouterr().out
+
+    engine.submit(f"({code}")
+    engine.submit(code)
+    assert "Please check" not in capsys.readouterr().out
+    assert not any("changed" in line for line in engine.suggest(code))
+
+    engine.submit(f"){code}")
+    assert any("changed" in line for line in engine.suggest(code))
@@ -0,0 +1,146 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "Python Files"))
+
+import autoLocationDescription as ald
+
+
+def test_regional_centre_itself_is_a_town():
+    description = ald.standard_description("Albury", "NSW", 53677, 452, "SW", "Albury", ("Albury", 0.3, "N"))
+    assert "Albury, a town in New South Wales." in description
+    assert "a suburb of Albury" not in description
+    assert "km n of Albury" not in description
+
+
+def test_centre_rounding_to_zero_km_is_a_town():
+    description = ald.standard_description("Albury Central", "NSW", 1000, 452, "SW", "Albury", ("Albury", 0.4, "N"))
+    assert "a town in New South Wales" in description
+
+
+def test_locality_near_centre_is_a_suburb_of_it():
+    description = ald.standard_description("Lavington", "NSW", 14000, 450, "SW", "Albury", ("Albury", 4.2, "N"))
+    assert "Lavington, a suburb of Albury, New South Wales." in description
+    assert "4km n of Albury" in description
+
+
+def small_gazetteer():
+    places = [("Rozelle", "NSW", "Inner West (Area)", -33.86465, 151.17428), ("Albury", "NSW", "Albury (C)", -36.0806, 146.9158)]
+    return {"places": places, "places_tree": ald.build_kdtree([(lat, lng) for _, _, _, lat, lng in places])}
+
+
+def test_coordinates_near_a_locality_are_described():
+    place, error = ald.locate_coordinates(-33.8646, 151.1742, small_gazetteer())
+    assert error is None
+    assert place[0] == "Rozelle"
+
+
+def test_coordinates_outside_australia_are_rejected():
+    place, error = ald.locate_coordinates(12, 34, small_gazetteer())
+    assert place is None
+    assert "outside Australia" in error
+
+
+def test_coordinates_far_from_every_locality_are_rejected():
+    place, error = ald.locate_coordinates(-25.0, 135.0, small_gazetteer())
+    assert place is None
+    assert "km away" in error
+
+
+def springfield_gazetteer():
+    # suburbs.csv calls them all "Springfield", the SALs have a suffix to tell them apart
+    sal = {"Springfield (Ipswich - Qld)": [("32627", "QLD")], "Springfield (NSW)": [("12345", "NSW")], "Newton": [("40001", "SA")]}
+    names = {name: [100, {entries[0][1]}] for name, entries in sal.items()}
+    names["Springfield"] = [20000, {"QLD", "NSW"}]
+    sal_names = {}
+    for name in sal:
+        sal_names.setdefault(ald.sal_base_name(name), []).append(name)
+    return {"sal": sal, "sal_names": sal_names, "search": ald.build_search_index(names)}
+
+
+def test_misspelt_suburb_suggests_the_sals_behind_a_suburbs_csv_name():
+    gazetteer = springfield_gazetteer()
+    assert ald.search_suburbs("Sprngfield", gazetteer) == (["Springfield"], True)
+
+    result = ald.resolve_place("Sprngfield", gazetteer)
+    assert "error" not in result
+    assert sorted(query for _, query in result["options"]) == ["Springfield (Ipswich - Qld)", "Springfield (NSW)"]
+
+
+def test_sal_code_of_a_locality_is_found_by_its_lga():
+    gazetteer = springfield_gazetteer()
+    assert ald.locality_sal_code("Springfield", "QLD", "Ipswich (C)", gazetteer) == "32627"
+
+
+@pytest.mark.parametrize("content", [b"cno_such_module\nthing\n.", b"\x80\x05\x95", b"not a pickle"])
+def test_unreadable_gazetteer_index_is_rebuilt(tmp_path, monkeypatch, content):
+    index_path = tmp_path / "gazetteer_index.pkl"
+    index_path.write_bytes(content)
+    monkeypatch.setattr(ald, "index_path", index_path)
+    monkeypatch.setattr(ald, "source_signature", lambda files: {})
+    monkeypatch.setattr(ald, "census_files", lambda: [])
+    monkeypatch.setattr(ald, "build_gazetteer", lambda *args: {"rebuilt": True})
+
+    assert ald.load_gazetteer() == {"rebuilt": True}
+    assert ald.load_gazetteer() == {"rebuilt": True}  # From the new index this time
+    assert [path.name for path in tmp_path.iterdir()] == ["gazetteer_index.pkl"]
+
+
+def test_failed_pickle_write_leaves_nothing_behind(tmp_path):
+    path = tmp_path / "index.pkl"
+    with pytest.raises(Exception):
+        ald.write_pickle(path, {"unpicklable": lambda: None})
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_kdtree_nearest_matches_brute_force():
+    rng = random.Random(1)
+    coordinates = [(rng.uniform(-44, -10), rng.uniform(113, 154)) for _ in range(2000)]
+    tree = ald.build_kdtree(coordinates)
+
+    for _ in range(200):
+        lat, lng = rng.uniform(-44, -10), rng.uniform(113, 154)
+        distances = [ald.haversine_distance_and_direction(lat, lng, *point)[0] for point in coordinates]
+        nearest = sorted(range(len(coordinates)), key=distances.__getitem__)
+
+        assert ald.kdtree_nearest(tree, lat, lng) == nearest[:1]
+        assert ald.kdtree_nearest(tree, lat, lng, k=5) == nearest[:5]
+
+
+def postcode_gazetteer():
+    # Rozelle and Lilyfield share 2039, Darwin's postcode is in suburbs.csv without its leading 0
+    rows = [("Rozelle", "NSW", "Inner West (Area)", -33.86465, 151.17428, 2039), ("Lilyfield", "NSW", "Inner West (Area)", -33.8747, 151.1651, 2039),
+            ("Darwin City", "NT", "Darwin (C)", -12.4634, 130.8456, 800)]
+    sal = {name: [(str(i), state)] for i, (name, state, *_) in enumerate(rows)}
+    places = [(name, state, lga, lat, lng) for name, state, lga, lat, lng, _ in rows]
+    postcodes = {}
+    for i, row in enumerate(rows):
+        postcodes.setdefault(ald.normalise_postcode(row[5]), []).append(i)
+    return {"sal": sal, "sal_names": {name: [name] for name in sal}, "places": places, "postcodes": postcodes,
+            "search": ald.build_search_index({name: [100, {state}] for name, state, *_ in rows})}
+
+
+@pytest.mark.parametrize("text, parsed", [
+    ("2039", ("", "2039")),
+    ("Rozelle 2039", ("Rozelle", "2039")),
+    ("Rozelle, NSW 2039", ("Rozelle", "2039")),
+    ("Darwin City 800", ("Darwin City", "0800")),
+    ("Rozelle", None),
+    ("-33.86, 151.17", None),
+])
+def test_postcode_is_picked_out_of_the_text(text, parsed):
+    assert ald.parse_postcode(text) == parsed
+
+
+def test_postcode_lookup():
+    gazetteer = postcode_gazetteer()
+
+    shared = ald.resolve_place("2039", gazetteer)
+    assert sorted(label for label, _ in shared["options"]) == ["Lilyfield, Inner West (Area)", "Rozelle, Inner West (Area)"]
+
+    assert ald.resolve_place("Rozelle 2039", gazetteer)["place"][0] == "Rozelle"
+    assert ald.resolve_place("0800", gazetteer)["place"][0] == "Darwin City"
+    assert "error" in ald.resolve_place("Darwin City 2039", gazetteer)
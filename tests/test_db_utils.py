@@ -0,0 +1,49 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "Python Files"))
+
+import db_utils
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = db_utils.connect(str(tmp_path / "test.db"))
+    conn.execute("CREATE TABLE t (x)")
+    yield conn
+    conn.close()
+
+
+def test_shared_database_uses_a_rollback_journal(conn):
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+
+
+def test_transaction_is_rolled_back_if_anything_in_it_fails(conn):
+    with pytest.raises(KeyboardInterrupt):
+        with db_utils.transaction(conn) as cur:
+            cur.execute("INSERT INTO t VALUES (1)")
+            raise KeyboardInterrupt
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_transaction_refuses_to_take_over_an_open_transaction(conn):
+    conn.execute("INSERT INTO t VALUES (1)")  # sqlite3 opens a transaction for this
+    with pytest.raises(sqlite3.ProgrammingError):
+        with db_utils.transaction(conn):
+            pass
+    conn.rollback()
+
+
+def test_run_transaction_only_runs_the_job_once_when_locked(conn):
+    calls = []
+
+    def job(cur):
+        calls.append(1)
+        raise sqlite3.OperationalError("database is locked")
+
+    with pytest.raises(sqlite3.OperationalError):
+        db_utils.run_transaction(conn, job)
+    assert len(calls) == 1